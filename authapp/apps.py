@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AuthappConfig(AppConfig):
     name = 'authapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
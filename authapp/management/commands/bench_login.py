@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authapp.tokens import get_or_create_user_id, get_token_issuer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many post-verification logins/sec one worker can issue, "
+        "comparing get_or_create + RefreshToken.for_user with the cached fast path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=100,
+            help="Number of distinct (existing) phone numbers to cycle through.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        User = get_user_model()
+        phones = [f"+9100{i:08d}" for i in range(options["users"])]
+        for phone in phones:
+            User.objects.get_or_create(phone_number=phone)
+
+        def baseline(phone):
+            user, _created = User.objects.get_or_create(phone_number=phone)
+            refresh = RefreshToken.for_user(user)
+            return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+        issuer = get_token_issuer()
+
+        def fast(phone):
+            return issuer.issue(get_or_create_user_id(phone))
+
+        # Warm the phone -> user id cache so the fast path measures returning users.
+        for phone in phones:
+            fast(phone)
+
+        for label, login in (("RefreshToken.for_user", baseline), ("fast path", fast)):
+            started = time.perf_counter()
+            for i in range(iterations):
+                login(phones[i % len(phones)])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label:>22}: {iterations / elapsed:8.0f} logins/sec "
+                f"({elapsed * 1e6 / iterations:.0f} us/login)"
+            )
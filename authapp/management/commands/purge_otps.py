@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from authapp.models import OTP
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired OTP rows in small batches. "
+        "Use --interval to keep running as a background purge loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=int(getattr(settings, "OTP_PURGE_BATCH_SIZE", 1000)),
+            help="Maximum rows deleted per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=float(getattr(settings, "OTP_PURGE_PAUSE_SECONDS", 0.05)),
+            help="Seconds to sleep between batches to leave room for live traffic.",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=0,
+            help="Stop a pass after this many batches (0 = until nothing is left).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Repeat a pass every N seconds instead of exiting (0 = run once).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive.")
+
+        interval = options["interval"]
+        while True:
+            self._purge_pass(batch_size, options["pause"], options["max_batches"])
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    def _purge_pass(self, batch_size: int, pause: float, max_batches: int) -> None:
+        started = time.monotonic()
+        deleted = 0
+        batches = 0
+
+        while True:
+            count = OTP.objects.delete_expired_batch(batch_size)
+            if not count:
+                break
+            deleted += count
+            batches += 1
+            if max_batches and batches >= max_batches:
+                break
+            # A short batch means we've caught up; no need for another round trip.
+            if count < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.monotonic() - started
+        rate = deleted / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(
+            f"Purged {deleted} expired OTPs in {batches} batches "
+            f"({elapsed:.2f}s, {rate:.0f} rows/sec)"
+        )
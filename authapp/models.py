@@ -1,6 +1,6 @@
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
+from django.db import connections, models, transaction
 from django.utils import timezone
 
 
@@ -43,6 +43,66 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.phone_number
 
 
+class OTPManager(models.Manager):
+    def claim_attempt(self, phone_number: str):
+        """
+        Count a verification attempt against the newest OTP for a phone number
+        and return that OTP, in a single ``UPDATE ... RETURNING`` statement.
+
+        The row lock taken by the UPDATE serialises concurrent attempts, so each
+        caller sees its own ``attempt_count`` and no more than
+        ``OTP_MAX_ATTEMPTS`` of them ever get as far as checking the hash.
+        Returns ``None`` if there is no OTP for the number.
+        """
+        qn = connections[self.db].ops.quote_name
+        meta = self.model._meta
+        table = qn(meta.db_table)
+        pk = qn(meta.pk.column)
+        attempts, phone, created = (
+            qn(meta.get_field(name).column)
+            for name in ("attempt_count", "phone_number", "created_at")
+        )
+        columns = ", ".join(qn(field.column) for field in meta.concrete_fields)
+        sql = (
+            f"UPDATE {table} SET {attempts} = {attempts} + 1 "
+            f"WHERE {pk} = ("
+            f"SELECT {pk} FROM {table} WHERE {phone} = %s "
+            f"ORDER BY {created} DESC LIMIT 1"
+            f") RETURNING {columns}"
+        )
+        with transaction.atomic(using=self.db):
+            return next(iter(self.raw(sql, [phone_number])), None)
+
+    def consume(self, pk) -> bool:
+        """
+        Delete a verified OTP. Returns ``False`` if another request got there first.
+        """
+        deleted, _ = self.filter(pk=pk).delete()
+        return bool(deleted)
+
+    def delete_expired_batch(self, batch_size: int, now=None) -> int:
+        """
+        Delete up to ``batch_size`` expired OTP rows and return how many went.
+
+        Rows are picked oldest-expiry first through the ``expires_at`` index and
+        locked with SKIP LOCKED, so a batch only holds row locks briefly and
+        never waits on (or blocks) a verification touching the same rows.
+        Exhausted OTPs are covered too: they stop being usable once they expire.
+        """
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            ids = list(
+                self.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return 0
+            deleted, _ = self.filter(pk__in=ids).delete()
+        return deleted
+
+
 class OTP(models.Model):
     phone_number = models.CharField(max_length=20, db_index=True)
     otp_hash = models.CharField(max_length=255)
@@ -50,6 +110,8 @@ class OTP(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     attempt_count = models.PositiveIntegerField(default=0)
 
+    objects = OTPManager()
+
     class Meta:
         indexes = [
             models.Index(fields=["phone_number"]),
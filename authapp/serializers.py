@@ -29,21 +29,15 @@ class VerifyOTPSerializer(serializers.Serializer):
         if not phone_number or not otp:
             raise serializers.ValidationError("Phone number and OTP are required.")
 
-        try:
-            otp_obj = (
-                OTP.objects.filter(phone_number=phone_number)
-                .order_by("-created_at")
-                .first()
-            )
-        except OTP.DoesNotExist:  # pragma: no cover - defensive
-            otp_obj = None
+        # Counts this attempt and fetches the OTP in one statement.
+        otp_obj = OTP.objects.claim_attempt(phone_number)
 
         if not otp_obj:
             raise serializers.ValidationError("OTP not found. Please request a new one.")
 
         max_attempts = int(getattr(settings, "OTP_MAX_ATTEMPTS", 5))
 
-        if otp_obj.attempt_count >= max_attempts:
+        if otp_obj.attempt_count > max_attempts:
             raise serializers.ValidationError(
                 f"Maximum OTP attempts exceeded. Please request a new OTP."
             )
@@ -52,8 +46,6 @@ class VerifyOTPSerializer(serializers.Serializer):
             raise serializers.ValidationError("OTP has expired. Please request a new one.")
 
         if not check_password(otp, otp_obj.otp_hash):
-            otp_obj.attempt_count += 1
-            otp_obj.save(update_fields=["attempt_count"])
             raise serializers.ValidationError("Invalid OTP.")
 
         attrs["otp_obj"] = otp_obj
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import User
+from .tokens import forget_user_id
+
+
+@receiver(post_init, sender=User)
+def remember_phone_number(sender, instance: User, **kwargs):
+    # Read from __dict__ so a deferred phone_number isn't loaded just for this.
+    instance._saved_phone_number = instance.__dict__.get("phone_number")
+
+
+@receiver(post_save, sender=User)
+def remember_saved_phone_number(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields is None or "phone_number" in update_fields:
+        instance._saved_phone_number = instance.phone_number
+
+
+@receiver(pre_save, sender=User)
+def evict_user_id_on_phone_change(
+    sender, instance: User, raw=False, update_fields=None, **kwargs
+):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "phone_number" not in update_fields:
+        return
+    old_phone = getattr(instance, "_saved_phone_number", None)
+    if old_phone and old_phone != instance.phone_number:
+        forget_user_id(old_phone)
+
+
+@receiver(post_delete, sender=User)
+def evict_user_id_on_delete(sender, instance: User, **kwargs):
+    forget_user_id(instance.phone_number)
@@ -0,0 +1,60 @@
+"""
+Outbound SMS for OTP delivery.
+
+Views never talk to the SMS provider directly: they call ``send_sms()``,
+which puts the message on an in-process delivery queue and returns at once.
+The queue batches messages and hands them to the configured backend
+(``OTP_SMS_BACKEND``) on a bounded thread pool, retrying failed batches with
+exponential backoff. Backends follow the same shape as Django's email
+backends; ``LocMemSMSBackend`` collects messages in ``outbox`` for tests.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Messages delivered through LocMemSMSBackend end up here.
+outbox: list["SMSMessage"] = []
+
+_queues: dict = {}
+
+
+@dataclass(frozen=True)
+class SMSMessage:
+    phone_number: str
+    body: str
+
+
+def get_backend(backend: str | None = None, **kwargs):
+    path = backend or getattr(
+        settings, "OTP_SMS_BACKEND", "authapp.sms.backends.ConsoleSMSBackend"
+    )
+    return import_string(path)(**kwargs)
+
+
+def get_delivery_queue(backend: str | None = None):
+    """
+    Return the process-wide delivery queue for ``backend``.
+
+    There is one queue (and one worker pool) per backend path, so each
+    provider gets its own concurrency limit.
+    """
+    from .queue import SMSDeliveryQueue
+
+    path = backend or getattr(
+        settings, "OTP_SMS_BACKEND", "authapp.sms.backends.ConsoleSMSBackend"
+    )
+    delivery_queue = _queues.get(path)
+    if delivery_queue is None:
+        delivery_queue = _queues.setdefault(
+            path,
+            SMSDeliveryQueue(get_backend(path), **getattr(settings, "OTP_SMS_QUEUE", {})),
+        )
+    return delivery_queue
+
+
+def send_sms(phone_number: str, body: str, backend: str | None = None) -> None:
+    """
+    Queue an SMS for background delivery. Never blocks on the provider.
+    """
+    get_delivery_queue(backend).enqueue(SMSMessage(phone_number=phone_number, body=body))
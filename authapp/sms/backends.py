@@ -0,0 +1,51 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BaseSMSBackend:
+    """
+    Base class for SMS providers.
+
+    Subclasses implement ``send_messages()``. It is called from the delivery
+    queue's worker threads with a batch of ``SMSMessage`` objects and should
+    raise if the batch could not be handed to the provider; the queue then
+    retries the whole batch with backoff.
+    """
+
+    # Upper bound on concurrent send_messages() calls for this provider.
+    max_concurrency = 4
+
+    def __init__(self, max_concurrency: int | None = None, **kwargs):
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+
+    def send_messages(self, messages) -> int:
+        raise NotImplementedError("subclasses of BaseSMSBackend must override send_messages()")
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    """
+    Writes messages to the log instead of sending them (development default).
+    """
+
+    def send_messages(self, messages) -> int:
+        for message in messages:
+            logger.info("SMS to %s: %s", message.phone_number, message.body)
+        return len(messages)
+
+
+class LocMemSMSBackend(BaseSMSBackend):
+    """
+    Stores messages in ``authapp.sms.outbox`` for tests.
+    """
+
+    _lock = threading.Lock()
+
+    def send_messages(self, messages) -> int:
+        from . import outbox
+
+        with self._lock:
+            outbox.extend(messages)
+        return len(messages)
@@ -0,0 +1,128 @@
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SMSDeliveryQueue:
+    """
+    In-process queue that delivers SMS messages in the background.
+
+    A dispatcher thread drains the queue into batches of up to ``batch_size``
+    messages, waiting at most ``batch_wait`` seconds for a batch to fill.
+    Batches are sent on a thread pool sized by the backend's
+    ``max_concurrency``, so a slow provider can tie up at most that many
+    threads. A failed batch is rescheduled after an exponential, jittered
+    backoff (without holding a pool thread) and dropped after ``max_retries``.
+
+    Threads are started lazily on first use, so forked server workers each
+    get their own.
+    """
+
+    def __init__(
+        self,
+        backend,
+        batch_size: int = 50,
+        batch_wait: float = 0.05,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self._queue: queue.Queue = queue.Queue()
+        self._executor = None
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+        # Messages enqueued but not yet delivered or dropped; used by flush().
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+
+    def enqueue(self, message) -> None:
+        self._ensure_started()
+        with self._pending_cond:
+            self._pending += 1
+        self._queue.put(message)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Block until every queued message was delivered or dropped.
+
+        Returns ``False`` if ``timeout`` elapsed first.
+        """
+        with self._pending_cond:
+            return self._pending_cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def _ensure_started(self) -> None:
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.backend.max_concurrency,
+                thread_name_prefix="sms-delivery",
+            )
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_forever,
+                name="sms-dispatcher",
+                daemon=True,
+            )
+            self._dispatcher.start()
+
+    def _dispatch_forever(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._deliver, batch, 0)
+
+    def _deliver(self, batch, attempt: int) -> None:
+        try:
+            self.backend.send_messages(batch)
+        except Exception:
+            if attempt >= self.max_retries:
+                logger.exception(
+                    "Dropping %d SMS after %d attempts", len(batch), attempt + 1
+                )
+                self._done(len(batch))
+                return
+
+            delay = min(self.max_backoff, self.retry_backoff * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning(
+                "SMS batch of %d failed (attempt %d), retrying in %.2fs",
+                len(batch),
+                attempt + 1,
+                delay,
+            )
+            timer = threading.Timer(
+                delay, self._executor.submit, args=(self._deliver, batch, attempt + 1)
+            )
+            timer.daemon = True
+            timer.start()
+            return
+
+        self._done(len(batch))
+
+    def _done(self, count: int) -> None:
+        with self._pending_cond:
+            self._pending -= count
+            if self._pending == 0:
+                self._pending_cond.notify_all()
@@ -1,3 +1,211 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import sms
+from .models import OTP, User
+from .sms.backends import BaseSMSBackend
+from .sms.queue import SMSDeliveryQueue
+from .throttling import SlidingWindowRateThrottle
+from .tokens import USER_ID_CACHE_KEY, get_or_create_user_id, issue_tokens
+
+
+class PurgeOTPTests(TestCase):
+    def _make_otps(self, count: int, expires_at):
+        OTP.objects.bulk_create(
+            OTP(phone_number=f"+9100000{i:04d}", otp_hash="x", expires_at=expires_at)
+            for i in range(count)
+        )
+
+    def test_delete_expired_batch_is_bounded(self):
+        self._make_otps(5, timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(OTP.objects.delete_expired_batch(batch_size=3), 3)
+        self.assertEqual(OTP.objects.count(), 2)
+
+    def test_purge_command_keeps_live_otps(self):
+        self._make_otps(7, timezone.now() - timedelta(minutes=1))
+        self._make_otps(2, timezone.now() + timedelta(minutes=5))
+
+        out = StringIO()
+        call_command("purge_otps", batch_size=3, pause=0, stdout=out)
+
+        self.assertEqual(OTP.objects.count(), 2)
+        self.assertIn("Purged 7 expired OTPs in 3 batches", out.getvalue())
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"otp_send_phone": "2/day", "otp_send_ip": "3/day"},
+    }
+)
+@override_settings(OTP_SMS_BACKEND="authapp.sms.backends.LocMemSMSBackend")
+class SendOTPThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _send(self, phone_number: str, ip: str = "10.0.0.1"):
+        return self.client.post(
+            reverse("send-otp"), {"phone_number": phone_number}, REMOTE_ADDR=ip
+        )
+
+    def test_per_phone_limit_rejects_before_creating_otp(self):
+        self.assertEqual(self._send("+919999900001").status_code, 200)
+        self.assertEqual(self._send("+919999900001").status_code, 200)
+
+        response = self._send("+919999900001", ip="10.0.0.2")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(OTP.objects.filter(phone_number="+919999900001").count(), 2)
+
+    def test_per_ip_limit_spans_phone_numbers(self):
+        for i in range(3):
+            self.assertEqual(self._send(f"+91999990001{i}").status_code, 200)
+
+        self.assertEqual(self._send("+919999900019").status_code, 429)
+        self.assertEqual(self._send("+919999900019", ip="10.0.0.9").status_code, 200)
+
+    def test_phone_throttled_requests_do_not_use_the_ip_allowance(self):
+        self.assertEqual(self._send("+919999900001").status_code, 200)
+        self.assertEqual(self._send("+919999900001").status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self._send("+919999900001").status_code, 429)
+
+        self.assertEqual(self._send("+919999900002").status_code, 200)
+        self.assertEqual(self._send("+919999900003").status_code, 429)
+
+    def test_throttled_retries_do_not_extend_the_limit(self):
+        day = 24 * 60 * 60
+        start = (time.time() // day) * day
+        with mock.patch.object(SlidingWindowRateThrottle, "timer", lambda self: start):
+            self.assertEqual(self._send("+919999900001").status_code, 200)
+            self.assertEqual(self._send("+919999900001").status_code, 200)
+            for i in range(5):
+                self.assertEqual(self._send("+919999900001", ip=f"10.0.1.{i}").status_code, 429)
+
+        # Half way into the next window the estimate is 2 * 0.5 + 1.
+        with mock.patch.object(SlidingWindowRateThrottle, "timer", lambda self: start + 1.5 * day):
+            self.assertEqual(self._send("+919999900001", ip="10.0.2.1").status_code, 200)
+
+
+class FlakySMSBackend(BaseSMSBackend):
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.sent = []
+
+    def send_messages(self, messages) -> int:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("provider unavailable")
+        self.sent.extend(messages)
+        return len(messages)
+
+
+@override_settings(OTP_SMS_BACKEND="authapp.sms.backends.LocMemSMSBackend")
+class SMSDeliveryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        sms.outbox.clear()
+
+    def test_send_otp_delivers_through_queue(self):
+        response = self.client.post(reverse("send-otp"), {"phone_number": "+919999900001"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(sms.get_delivery_queue().flush(timeout=5))
+        self.assertEqual(len(sms.outbox), 1)
+        self.assertEqual(sms.outbox[0].phone_number, "+919999900001")
+
+    def test_failed_batches_are_retried(self):
+        backend = FlakySMSBackend(failures=2)
+        delivery_queue = SMSDeliveryQueue(backend, batch_wait=0.01, retry_backoff=0.01)
+
+        for i in range(3):
+            delivery_queue.enqueue(sms.SMSMessage(f"+9199999000{i:02d}", "code"))
+
+        self.assertTrue(delivery_queue.flush(timeout=5))
+        self.assertEqual(len(backend.sent), 3)
+
+
+class VerifyOTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone_number = "+919999900001"
+        self.otp = OTP.objects.create(
+            phone_number=self.phone_number,
+            otp_hash=make_password("123456"),
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+
+    def _verify(self, otp: str):
+        return self.client.post(
+            reverse("verify-otp"), {"phone_number": self.phone_number, "otp": otp}
+        )
+
+    def test_valid_otp_issues_tokens_and_consumes_otp(self):
+        response = self._verify("123456")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+        self.assertTrue(User.objects.filter(phone_number=self.phone_number).exists())
+        self.assertFalse(OTP.objects.filter(pk=self.otp.pk).exists())
+        self.assertEqual(self._verify("123456").status_code, 400)
+
+    def test_issued_access_token_authenticates(self):
+        access = self._verify("123456").data["access"]
+
+        response = self.client.get(
+            reverse("driver-me"), HTTP_AUTHORIZATION=f"Bearer {access}"
+        )
+
+        # Authenticated, the user just has no driver profile yet.
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(OTP_MAX_ATTEMPTS=2)
+    def test_attempts_are_counted_atomically(self):
+        self.assertEqual(self._verify("000000").status_code, 400)
+        self.assertEqual(self._verify("000000").status_code, 400)
+
+        response = self._verify("123456")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Maximum OTP attempts exceeded", str(response.data))
+        self.otp.refresh_from_db()
+        self.assertEqual(self.otp.attempt_count, 3)
+
+
+class UserIdCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_issued_claim_keeps_the_pk_type(self):
+        user = User.objects.create_user("+919999900002")
+        access = AccessToken(issue_tokens(user.pk)["access"])
+
+        self.assertEqual(access[api_settings.USER_ID_CLAIM], user.pk)
+
+    def test_phone_change_evicts_cached_id_without_a_query(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user_id = get_or_create_user_id("+919999900003")
+        user = User.objects.get(pk=user_id)
+
+        with self.assertNumQueries(1):
+            user.save(update_fields=["is_active"])
+        self.assertEqual(cache.get(USER_ID_CACHE_KEY % "+919999900003"), user_id)
+
+        user.phone_number = "+919999900004"
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertIsNone(cache.get(USER_ID_CACHE_KEY % "+919999900003"))
@@ -0,0 +1,149 @@
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Sliding-window counter throttle backed by the Django cache.
+
+    Instead of storing a timestamp list per key (what ``SimpleRateThrottle``
+    does, with a racy get/set), each key keeps one integer counter per fixed
+    window. The request count is estimated as the current window plus the
+    previous window weighted by how much of it still overlaps the sliding
+    window. Counters are bumped with ``cache.incr``, which is atomic on Redis,
+    so concurrent workers can't slip past the limit together. A request that
+    gets throttled is taken back out with ``cache.decr``; only allowed
+    requests count, so a client retrying while throttled isn't locked out.
+    For the same reason, a request let through here but throttled by another
+    class on the view is taken back out with ``rollback()`` (see
+    ``ThrottleRollbackMixin``).
+
+    The rate for a request is looked up from ``DEFAULT_THROTTLE_RATES`` using
+    ``<view.throttle_scope>_<scope_suffix>``, e.g. ``otp_send_phone``.
+    """
+
+    cache_alias = "default"
+    cache_format = "throttle_%(scope)s_%(ident)s"
+    scope_suffix: str = ""
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved in allow_request().
+        self.counted_key = None
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            return None
+
+    def get_ident_for_scope(self, request, view):
+        raise NotImplementedError(".get_ident_for_scope() must be overridden")
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_for_scope(request, view)
+        if not ident:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        throttle_scope = getattr(view, "throttle_scope", None)
+        if not throttle_scope:
+            return True
+
+        self.scope = f"{throttle_scope}_{self.scope_suffix}"
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cache = caches[self.cache_alias]
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key = f"{self.key}:{window}"
+        previous_key = f"{self.key}:{window - 1}"
+
+        # Count this request first so racing requests each see each other.
+        cache.add(current_key, 0, self.duration * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # The key expired between add() and incr(); start a fresh window.
+            cache.set(current_key, 1, self.duration * 2)
+            current = 1
+        previous = cache.get(previous_key, 0)
+
+        self.elapsed = (self.now % self.duration) / self.duration
+        estimated = previous * (1 - self.elapsed) + current
+        self.counted_key = current_key
+        if estimated > self.num_requests:
+            self.rollback()
+            return self.throttle_failure()
+        return True
+
+    def rollback(self) -> None:
+        """Take back the hit the last ``allow_request()`` counted, if any."""
+        if self.counted_key is None:
+            return
+        try:
+            caches[self.cache_alias].decr(self.counted_key)
+        except ValueError:
+            pass
+        self.counted_key = None
+
+    def wait(self):
+        # Worst case the caller has to wait for the current window to roll over.
+        return self.duration * (1 - self.elapsed)
+
+
+class PhoneNumberRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limits requests per phone number found in the request body.
+    """
+
+    scope_suffix = "phone"
+
+    def get_ident_for_scope(self, request, view):
+        data = request.data
+        phone_number = data.get("phone_number") if hasattr(data, "get") else None
+        if not isinstance(phone_number, str):
+            return None
+        return "".join(phone_number.split()) or None
+
+
+class ClientIPRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limits requests per client IP (honours ``NUM_PROXIES``).
+    """
+
+    scope_suffix = "ip"
+
+    def get_ident_for_scope(self, request, view):
+        return self.get_ident(request)
+
+
+class ThrottleRollbackMixin:
+    """
+    View mixin: when any throttle rejects a request, roll back the hits the
+    other throttles counted for it, so e.g. a number blocked by the phone
+    throttle doesn't also use up its client's IP allowance.
+    """
+
+    def check_throttles(self, request):
+        throttles = self.get_throttles()
+        rejected = [
+            throttle for throttle in throttles if not throttle.allow_request(request, self)
+        ]
+        if not rejected:
+            return
+        for throttle in throttles:
+            if throttle not in rejected and hasattr(throttle, "rollback"):
+                throttle.rollback()
+        durations = [throttle.wait() for throttle in rejected]
+        self.throttled(
+            request, max((duration for duration in durations if duration is not None), default=None)
+        )
@@ -0,0 +1,109 @@
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+USER_ID_CACHE_KEY = "auth_user_id:%s"
+USER_ID_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_or_create_user_id(phone_number: str):
+    """
+    Return the id of the user with ``phone_number``, creating the user if needed.
+
+    Ids are cached by phone number, so a returning user costs one cache hit
+    instead of a SELECT. authapp.signals evicts entries when users change.
+    """
+    key = USER_ID_CACHE_KEY % phone_number
+    user_id = cache.get(key)
+    if user_id is None:
+        user, _created = get_user_model().objects.get_or_create(phone_number=phone_number)
+        user_id = user.pk
+        # Only publish ids of rows that actually got committed.
+        transaction.on_commit(lambda: cache.set(key, user_id, USER_ID_CACHE_TIMEOUT))
+    return user_id
+
+
+def forget_user_id(phone_number: str) -> None:
+    cache.delete(USER_ID_CACHE_KEY % phone_number)
+
+
+class TokenIssuer:
+    """
+    Builds the same access/refresh pair as ``RefreshToken.for_user()`` from a
+    user id alone.
+
+    Claim names, token types and lifetimes are read from SIMPLE_JWT once and
+    kept as templates, so issuing a pair is two dict copies, two uuids and
+    two signatures. ``supports_fast_path`` is ``False`` when SIMPLE_JWT needs
+    the full user object (revocation claims) or a database write (blacklist
+    app); callers should fall back to ``RefreshToken.for_user()`` then.
+    """
+
+    def __init__(self):
+        from rest_framework_simplejwt.state import token_backend
+
+        self.encode = token_backend.encode
+        self.user_id_claim = api_settings.USER_ID_CLAIM
+        self.jti_claim = api_settings.JTI_CLAIM
+        self.access_lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        self.refresh_lifetime = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+        self.access_template = {api_settings.TOKEN_TYPE_CLAIM: "access"}
+        self.refresh_template = {api_settings.TOKEN_TYPE_CLAIM: "refresh"}
+        self.supports_fast_path = not (
+            api_settings.CHECK_REVOKE_TOKEN
+            or "rest_framework_simplejwt.token_blacklist" in settings.INSTALLED_APPS
+        )
+
+    def issue(self, user_id) -> dict[str, str]:
+        now = int(time.time())
+        # Same claim type as RefreshToken.for_user(): ints as-is, others as str.
+        if not isinstance(user_id, int):
+            user_id = str(user_id)
+
+        refresh = self.refresh_template.copy()
+        refresh["exp"] = now + self.refresh_lifetime
+        refresh["iat"] = now
+        refresh[self.jti_claim] = uuid4().hex
+        refresh[self.user_id_claim] = user_id
+
+        access = self.access_template.copy()
+        access["exp"] = now + self.access_lifetime
+        access["iat"] = now
+        access[self.jti_claim] = uuid4().hex
+        access[self.user_id_claim] = user_id
+
+        return {"access": self.encode(access), "refresh": self.encode(refresh)}
+
+
+_issuer: TokenIssuer | None = None
+
+
+def get_token_issuer() -> TokenIssuer:
+    global _issuer
+    if _issuer is None:
+        _issuer = TokenIssuer()
+    return _issuer
+
+
+def issue_tokens(user_id) -> dict[str, str]:
+    issuer = get_token_issuer()
+    if issuer.supports_fast_path:
+        return issuer.issue(user_id)
+
+    refresh = RefreshToken.for_user(get_user_model().objects.get(pk=user_id))
+    return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+
+@receiver(setting_changed)
+def _reset_token_issuer(*, setting, **kwargs):
+    global _issuer
+    if setting in ("SIMPLE_JWT", "INSTALLED_APPS"):
+        _issuer = None
@@ -3,24 +3,27 @@ import random
 from datetime import timedelta
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import OTP
 from .serializers import SendOTPSerializer, VerifyOTPSerializer
+from .sms import send_sms
+from .throttling import ClientIPRateThrottle, PhoneNumberRateThrottle, ThrottleRollbackMixin
+from .tokens import get_or_create_user_id, issue_tokens
 
 logger = logging.getLogger(__name__)
-User = get_user_model()
 
 
-class SendOTPView(APIView):
+class SendOTPView(ThrottleRollbackMixin, APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [ClientIPRateThrottle, PhoneNumberRateThrottle]
+    throttle_scope = "otp_send"
 
     def post(self, request, *args, **kwargs):
         serializer = SendOTPSerializer(data=request.data)
@@ -43,9 +46,13 @@ class SendOTPView(APIView):
             expires_at=expires_at,
         )
 
-        # For assignment purposes, just log the OTP instead of sending SMS
-        logger.info("Generated OTP %s for %s (expires in %s minutes)", otp_value, phone_number, expiry_minutes)
-        print(f"[DEBUG] OTP for {phone_number}: {otp_value}")
+        # Delivery happens on a background queue, so the provider's latency
+        # never shows up in this request.
+        send_sms(
+            phone_number,
+            f"Your verification code is {otp_value}. It expires in {expiry_minutes} minutes.",
+        )
+        logger.info("Queued OTP for %s (expires in %s minutes)", phone_number, expiry_minutes)
 
         return Response(
             {"detail": "OTP sent successfully."},
@@ -53,8 +60,10 @@ class SendOTPView(APIView):
         )
 
 
-class VerifyOTPView(APIView):
+class VerifyOTPView(ThrottleRollbackMixin, APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [ClientIPRateThrottle, PhoneNumberRateThrottle]
+    throttle_scope = "otp_verify"
 
     def post(self, request, *args, **kwargs):
         serializer = VerifyOTPSerializer(data=request.data)
@@ -63,18 +72,15 @@ class VerifyOTPView(APIView):
         otp_obj: OTP = serializer.validated_data["otp_obj"]
         phone_number = serializer.validated_data["phone_number"]
 
-        # OTP is valid at this point; we can delete it to prevent reuse
-        otp_obj.delete()
-
-        user, _created = User.objects.get_or_create(phone_number=phone_number)
-
-        refresh = RefreshToken.for_user(user)
-
-        return Response(
-            {
-                "access": str(refresh.access_token),
-                "refresh": str(refresh),
-            },
-            status=status.HTTP_200_OK,
-        )
+        # OTP is valid at this point; consume it and upsert the user together
+        # so a concurrent request with the same OTP can't log in twice.
+        with transaction.atomic():
+            if not OTP.objects.consume(otp_obj.pk):
+                return Response(
+                    {"detail": "OTP has already been used. Please request a new one."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            user_id = get_or_create_user_id(phone_number)
+
+        return Response(issue_tokens(user_id), status=status.HTTP_200_OK)
 
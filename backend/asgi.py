@@ -11,21 +11,20 @@ import os
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-
-from tracking.routing import websocket_urlpatterns
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
+# Set up Django before importing consumers, which import models.
 django_asgi_app = get_asgi_application()
 
+from tracking.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
-        "websocket": AuthMiddlewareStack(
-            URLRouter(
-                websocket_urlpatterns,
-            )
+        # TrackingConsumer authenticates by JWT itself; no session/cookie auth.
+        "websocket": URLRouter(
+            websocket_urlpatterns,
         ),
     }
 )
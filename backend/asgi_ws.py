@@ -0,0 +1,27 @@
+"""
+ASGI entry point for WebSocket-only workers.
+
+Loads backend.settings_ws and routes nothing but the tracking socket:
+
+    daphne backend.asgi_ws:application
+
+TrackingConsumer authenticates with the JWT in the query string, so there
+is no session or cookie middleware in front of it.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings_ws")
+django.setup(set_prefix=False)
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from tracking.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter(
+    {
+        "websocket": URLRouter(websocket_urlpatterns),
+    }
+)
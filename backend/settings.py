@@ -55,15 +55,82 @@ TEMPLATES = [
 WSGI_APPLICATION = "backend.wsgi.application"
 ASGI_APPLICATION = "backend.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
+# --- CHANNEL LAYERS ---
+# CHANNEL_LAYER_BACKEND picks one of the presets below: "memory" (single
+# process only: local runs and tests), "redis" (channels_redis lists with
+# per-channel capacity and expiry) or "pubsub" (Redis pub/sub: nothing is
+# stored, messages for sockets that aren't listening are simply lost).
+# Redis is the default whenever REDIS_URL is set.
+#
+# CHANNEL_REDIS_HOSTS takes several comma-separated Redis URLs; both Redis
+# layers shard channels and groups across them by a hash of the name.
+#
+# CHANNEL_LAYER_RIDES moves the ride groups (the location fan-out, by far the
+# busiest traffic) onto a layer of their own, e.g. "pubsub" while everything
+# else stays on "redis". See tracking.events.get_ride_channel_layer().
+CHANNEL_REDIS_HOSTS = [
+    host.strip()
+    for host in os.getenv(
+        "CHANNEL_REDIS_HOSTS", os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+    ).split(",")
+    if host.strip()
+]
+
+CHANNEL_LAYER_PRESETS = {
+    "memory": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 200, "expiry": 10},
+    },
+    "redis": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")],
+            "hosts": CHANNEL_REDIS_HOSTS,
+            # A location frame is stale after a few seconds; don't keep it longer.
+            "expiry": 10,
+            "group_expiry": 24 * 60 * 60,
+            # Named (non-specific) channels; nothing in this project reads one,
+            # so anything queued there is kept small.
+            "capacity": 100,
+            "channel_capacity": {
+                # Per-socket inboxes, which is where every group fan-out lands
+                # (the drain listener's too, see tracking.drain). Riders are
+                # conflated on top of this.
+                "specific.*": 200,
+            },
         },
-    }
+    },
+    "pubsub": {
+        "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+        "CONFIG": {"hosts": CHANNEL_REDIS_HOSTS},
+    },
 }
 
+CHANNEL_LAYER_BACKEND = os.getenv(
+    "CHANNEL_LAYER_BACKEND", "redis" if os.getenv("REDIS_URL") else "memory"
+)
+CHANNEL_LAYERS = {"default": CHANNEL_LAYER_PRESETS[CHANNEL_LAYER_BACKEND]}
+
+TRACKING_RIDE_CHANNEL_LAYER = "default"
+if os.getenv("CHANNEL_LAYER_RIDES"):
+    CHANNEL_LAYERS["rides"] = CHANNEL_LAYER_PRESETS[os.getenv("CHANNEL_LAYER_RIDES")]
+    TRACKING_RIDE_CHANNEL_LAYER = "rides"
+
+# Shared counters (OTP throttling) live in Redis when it is configured;
+# local runs and tests fall back to a per-process in-memory cache.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -85,6 +152,13 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # Sliding-window limits for the OTP endpoints, see authapp.throttling.
+    "DEFAULT_THROTTLE_RATES": {
+        "otp_send_phone": "3/min",
+        "otp_send_ip": "20/min",
+        "otp_verify_phone": "10/min",
+        "otp_verify_ip": "60/min",
+    },
 }
 
 SIMPLE_JWT = {
@@ -105,10 +179,64 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 OTP_EXPIRY_MINUTES = 5
 OTP_MAX_ATTEMPTS = 5
+OTP_PURGE_BATCH_SIZE = 1000
+OTP_PURGE_PAUSE_SECONDS = 0.05
+
+# Outbound SMS (see authapp.sms). The console backend only logs the message.
+OTP_SMS_BACKEND = "authapp.sms.backends.ConsoleSMSBackend"
+OTP_SMS_QUEUE = {
+    "batch_size": 50,
+    "batch_wait": 0.05,
+    "max_retries": 3,
+    "retry_backoff": 0.5,
+}
 
+# --- TRACKING ---
+TRACKING_RIDE_BATCH_LIMIT = 500
+TRACKING_GEOFENCE_CELL_DEGREES = 0.05
+# Fences wider than this (in degrees of latitude or longitude) are refused.
+TRACKING_GEOFENCE_MAX_SPAN_DEGREES = 1.0
+TRACKING_GEOFENCE_REFRESH_SECONDS = 5
+TRACKING_ETA_DEFAULT_SPEED_KMH = 25
+TRACKING_PROGRESS_SMOOTHING = 0.3
+
+# Ping intervals pushed to driver apps (see tracking.cadence).
+TRACKING_CADENCE = {
+    "idle_ms": 30_000,
+    "unwatched_ms": 15_000,
+    "approach_ms": 4_000,
+    "watched_ms": 2_000,
+    "max_ms": 60_000,
+    "load_threshold": 2_000,
+    "recheck_s": 30,
+}
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    }
-}
\ No newline at end of file
+# Riders that subscribe with "ack": true get at most this many unacked
+# location frames; newer ones are conflated per ride until they ack.
+TRACKING_RIDER_ACK_WINDOW = 8
+# Acking rider sockets whose oldest unacked frame is this old are closed.
+TRACKING_SLOW_CONSUMER_SECONDS = 10
+
+# Record driver_location/subscribe_ride frames for manage.py replay_trace;
+# "{pid}" is replaced per worker. Off when unset.
+TRACKING_TRACE_PATH = os.getenv("TRACKING_TRACE_PATH")
+
+# Graceful drain on deploys; see tracking.drain.
+TRACKING_DRAIN = {
+    "signal": "SIGUSR1",
+    "reconnect_min_ms": 1_000,
+    "reconnect_max_ms": 15_000,
+}
+
+# Applied in order to every driver fix before it is stored or broadcast
+# (see tracking.fixes). Add {"NAME": "tracking.fixes.KalmanSmoother"} last
+# to smooth coordinates as well.
+TRACKING_FIX_FILTERS = [
+    {"NAME": "tracking.fixes.RangeFilter"},
+    {"NAME": "tracking.fixes.MonotonicTimestampFilter", "OPTIONS": {"max_future_skew_s": 30}},
+    {
+        "NAME": "tracking.fixes.MaxSpeedFilter",
+        "OPTIONS": {"max_speed_kmh": 200, "reanchor_after": 3},
+    },
+    {"NAME": "tracking.fixes.JitterFilter", "OPTIONS": {"min_distance_m": 3, "heartbeat_s": 30}},
+]
@@ -0,0 +1,22 @@
+"""
+Settings for WebSocket-only workers (see backend/asgi_ws.py).
+
+Same configuration as backend.settings, minus everything that only the HTTP
+side uses: admin, sessions, messages, static files, templates, DRF's app and
+all middleware. A worker on this profile imports and starts noticeably
+faster and serves nothing but /ws/tracking/; HTTP stays on backend.asgi.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "authapp",
+    "tracking",
+]
+
+# Nothing here handles HTTP requests.
+ROOT_URLCONF = "backend.urls_ws"
+MIDDLEWARE = []
+TEMPLATES = []
+ASGI_APPLICATION = "backend.asgi_ws.application"
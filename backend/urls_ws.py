@@ -0,0 +1,7 @@
+"""
+URL configuration for the WebSocket-only profile (backend.settings_ws).
+
+Workers on that profile serve no HTTP, so there is nothing to route.
+"""
+
+urlpatterns = []
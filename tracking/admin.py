@@ -1,11 +1,12 @@
 from django.contrib import admin
 
-from .models import Driver, DriverLocation, Ride
+from .models import Driver, DriverLocation, Geofence, Ride
 
 
 @admin.register(Driver)
 class DriverAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "is_active")
+    list_select_related = ("user",)
     search_fields = ("user__phone_number",)
     list_filter = ("is_active",)
 
@@ -13,10 +14,20 @@ class DriverAdmin(admin.ModelAdmin):
 @admin.register(DriverLocation)
 class DriverLocationAdmin(admin.ModelAdmin):
     list_display = ("driver", "latitude", "longitude", "updated_at")
+    list_select_related = ("driver__user",)
     search_fields = ("driver__user__phone_number",)
 
 
 @admin.register(Ride)
 class RideAdmin(admin.ModelAdmin):
-    list_display = ("ride_id", "driver", "rider", "created_at")
+    list_display = ("ride_id", "driver", "rider", "status", "created_at")
+    list_select_related = ("driver__user", "rider")
     search_fields = ("ride_id", "driver__user__phone_number", "rider__phone_number")
+    list_filter = ("status",)
+
+
+@admin.register(Geofence)
+class GeofenceAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "kind", "is_active", "updated_at")
+    search_fields = ("name",)
+    list_filter = ("kind", "is_active")
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class TrackingConfig(AppConfig):
     name = 'tracking'
+
+    def ready(self):
+        from . import drain, signals  # noqa: F401
+
+        # At startup, so a drain request can't hit the default action (exit)
+        # on a worker that hasn't served a socket yet.
+        drain.registry.install_signal_handler()
@@ -0,0 +1,75 @@
+"""
+Server-chosen ping interval for driver apps.
+
+The interval depends on the driver's ride (none, approaching pickup, on
+trip), on whether anyone is watching that ride, and on how loaded this
+worker is. Rider subscriptions are counted per ride in the shared cache so
+every worker sees the same numbers.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+SUBSCRIBERS_CACHE_KEY = "tracking_ride_subscribers:%s"
+# Counts are refreshed on every change; the TTL only cleans up after crashes.
+SUBSCRIBERS_CACHE_TIMEOUT = 6 * 60 * 60
+
+DEFAULT_CADENCE = {
+    "idle_ms": 30_000,
+    "unwatched_ms": 15_000,
+    "approach_ms": 4_000,
+    "watched_ms": 2_000,
+    "max_ms": 60_000,
+    # Open sockets on one worker above which intervals are stretched.
+    "load_threshold": 2_000,
+    # How often a driver socket re-evaluates its cadence on its own.
+    "recheck_s": 30,
+}
+
+
+def cadence_settings() -> dict:
+    return {**DEFAULT_CADENCE, **getattr(settings, "TRACKING_CADENCE", {})}
+
+
+async def add_subscriber(ride_id: str) -> None:
+    key = SUBSCRIBERS_CACHE_KEY % ride_id
+    await cache.aadd(key, 0, SUBSCRIBERS_CACHE_TIMEOUT)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, SUBSCRIBERS_CACHE_TIMEOUT)
+    await cache.atouch(key, SUBSCRIBERS_CACHE_TIMEOUT)
+
+
+async def remove_subscriber(ride_id: str) -> None:
+    key = SUBSCRIBERS_CACHE_KEY % ride_id
+    try:
+        if await cache.adecr(key) < 0:
+            await cache.aset(key, 0, SUBSCRIBERS_CACHE_TIMEOUT)
+    except ValueError:
+        pass
+
+
+async def subscriber_count(ride_id: str) -> int:
+    return await cache.aget(SUBSCRIBERS_CACHE_KEY % ride_id, 0)
+
+
+def load_factor() -> float:
+    """How far past ``load_threshold`` this worker's open sockets are (>= 1)."""
+    threshold = cadence_settings()["load_threshold"]
+    open_sockets = metrics.get("sockets.open")
+    return max(1.0, open_sockets / threshold) if threshold else 1.0
+
+
+def choose_interval_ms(ride_status: str | None, subscribers: int, load: float = 1.0) -> int:
+    config = cadence_settings()
+    if ride_status is None:
+        interval = config["idle_ms"]
+    elif subscribers <= 0:
+        interval = config["unwatched_ms"]
+    elif ride_status == "in_progress":
+        interval = config["watched_ms"]
+    else:
+        interval = config["approach_ms"]
+    return int(min(interval * load, config["max_ms"]))
@@ -189,7 +189,11 @@
 
 
 
+import asyncio
+import datetime
 import logging
+import time
+from collections import deque
 from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
@@ -197,9 +201,21 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from django.conf import settings
 from django.utils import timezone
-
+from django.utils.dateparse import parse_datetime
+
+from . import cadence, drain, metrics, ride_access, trace
+from .events import (
+    driver_group_name,
+    get_ride_channel_layer,
+    ride_channel_layer_alias,
+    ride_group_name,
+)
+from .fixes import Fix, FixPipeline
+from .geofence import geofence_group_name, registry as geofence_registry
 from .models import Driver, DriverLocation, Ride
+from .progress import RideProgress
 
 logger = logging.getLogger(__name__)
 jwt_auth = JWTAuthentication()
@@ -211,6 +227,14 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
     """
 
     async def connect(self):
+        # A draining worker turns sockets away before spending time on auth.
+        # Closing before accept() would reach the client as an HTTP 403, so
+        # accept first and close with 1013 (try again later).
+        if drain.registry.draining:
+            await self.accept()
+            await self.close(code=1013)
+            return
+
         # SynchronousOnlyOperation error-ai thavirkka inga await use panrom
         user = await self._authenticate_user()
         if not user:
@@ -221,17 +245,48 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
         self.user = user
         self.driver = None
         self.ride_id = None
+        self.ride_driver_id = None
+        self.cadence_ms = None
+        self.cadence_checked_at = 0.0
+        # Flow control for riders that ack (see location_update): frames
+        # sent but not acked yet, and the newest one held back per ride.
+        self.ack_window = 0
+        self.unacked = deque()
+        self.pending_updates = {}
+        self.closing = False
+        self.permitted_rides = None
+        await self._attach_ride_layer()
+        self.geofences_inside = frozenset()
+        self.progress = None
+        self.progress_ride_id = None
+        self.geofence_subscriptions = set()
         await self.accept()
+        await drain.registry.register(self)
+        metrics.incr("sockets.open")
         logger.info(f"User {user.id} connected via WebSocket")
 
     async def disconnect(self, close_code):
-        if getattr(self, "ride_id", None):
+        if not getattr(self, "user", None):
+            return
+        metrics.incr("sockets.open", -1)
+        drain.registry.unregister(self)
+
+        if self.ride_id:
+            await self._unsubscribe_ride()
+        if self.ride_listener:
+            self.ride_listener.cancel()
+
+        for fence_id in self.geofence_subscriptions:
             await self.channel_layer.group_discard(
-                self._ride_group_name(self.ride_id),
+                geofence_group_name(fence_id),
                 self.channel_name,
             )
 
-        if getattr(self, "driver", None):
+        if self.driver:
+            await self.channel_layer.group_discard(
+                driver_group_name(self.driver.id),
+                self.channel_name,
+            )
             logger.info("Driver %s disconnected", self.driver.id)
 
     async def receive_json(self, content, **kwargs):
@@ -243,6 +298,10 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
             await self._handle_driver_location(content)
         elif event == "subscribe_ride":
             await self._handle_subscribe_ride(content)
+        elif event == "subscribe_geofence":
+            await self._handle_subscribe_geofence(content)
+        elif event == "ack":
+            await self._handle_ack(content)
         else:
             await self.send_json({"error": "Unknown event type."})
 
@@ -257,10 +316,23 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"error": "Driver not found."})
             return
 
+        if self.driver:
+            await self.channel_layer.group_discard(
+                driver_group_name(self.driver.id),
+                self.channel_name,
+            )
         self.driver = driver
+        self.fix_pipeline = FixPipeline()
+        self.cadence_ms = None
+        await self.channel_layer.group_add(
+            driver_group_name(driver.id),
+            self.channel_name,
+        )
         await self.send_json({"status": "driver_registered", "driver_id": driver_id})
+        await self._push_cadence()
 
     async def _handle_driver_location(self, content):
+        started = time.perf_counter()
         if not self.driver:
             await self.send_json({"error": "Driver not identified."})
             return
@@ -274,26 +346,64 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
 
         timestamp = content.get("timestamp") or timezone.now().isoformat()
 
-        await self._update_location(self.driver, latitude, longitude)
+        try:
+            accuracy = float(content["accuracy"]) if content.get("accuracy") is not None else None
+        except (TypeError, ValueError):
+            accuracy = None
+
+        writer = trace.get_writer()
+        if writer is not None:
+            client_ts = self._fix_time(content["timestamp"]) if content.get("timestamp") else None
+            writer.location(self.driver.id, latitude, longitude, accuracy, client_ts)
+
+        # Bad or jittery fixes stop here: no DB write, no fan-out.
+        with metrics.timed("location.filter"):
+            fix = self.fix_pipeline.process(
+                Fix(latitude, longitude, self._fix_time(timestamp), accuracy)
+            )
+        if fix is None:
+            await self.send_json(
+                {"status": "location_rejected", "reason": self.fix_pipeline.rejected_reason}
+            )
+            return
+        latitude, longitude = fix.latitude, fix.longitude
+
+        with metrics.timed("location.store"):
+            await self._update_location(self.driver, latitude, longitude)
+        with metrics.timed("location.geofence"):
+            await self._check_geofences(latitude, longitude, timestamp)
 
         # Broadcast to any riders subscribed to this driver's active ride
-        ride = await self._get_latest_ride_for_driver(self.driver)
+        with metrics.timed("location.ride_lookup"):
+            ride = await self._get_active_ride_for_driver(self.driver)
         if ride:
-            await self.channel_layer.group_send(
-                self._ride_group_name(ride.ride_id),
+            if self.progress_ride_id != ride.ride_id:
+                self.progress = RideProgress()
+                self.progress_ride_id = ride.ride_id
+            progress = self.progress.update(latitude, longitude, fix.at, ride.target)
+
+            data = await drain.rides.record(
+                ride.ride_id,
                 {
-                    "type": "location_update",
-                    "data": {
-                        "driver_id": self.driver.id,
-                        "ride_id": ride.ride_id,
-                        "latitude": latitude,
-                        "longitude": longitude,
-                        "timestamp": timestamp,
-                    },
+                    "driver_id": self.driver.id,
+                    "ride_id": ride.ride_id,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "timestamp": timestamp,
+                    "progress": progress,
                 },
             )
+            with metrics.timed("location.fanout"):
+                await self.ride_layer.group_send(
+                    self._ride_group_name(ride.ride_id),
+                    {"type": "location_update", "data": data},
+                )
 
         await self.send_json({"status": "location_updated"})
+        metrics.observe("location.total", time.perf_counter() - started)
+
+        if time.monotonic() - self.cadence_checked_at >= cadence.cadence_settings()["recheck_s"]:
+            await self._push_cadence(ride)
 
     async def _handle_subscribe_ride(self, content):
         ride_id = content.get("ride_id")
@@ -301,21 +411,246 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"error": "ride_id is required."})
             return
 
-        ride_exists = await self._ride_exists(ride_id)
-        if not ride_exists:
+        writer = trace.get_writer()
+        if writer is not None:
+            writer.subscribe(self.user.id, ride_id)
+
+        ride_driver_id = await self._authorize_ride(ride_id)
+        if ride_driver_id is None:
             await self.send_json({"error": "Ride not found."})
             return
 
+        if self.ride_id:
+            await self._unsubscribe_ride()
+
         self.ride_id = ride_id
-        await self.channel_layer.group_add(
+        self.ride_driver_id = ride_driver_id
+        self.ack_window = self._ack_window() if content.get("ack") else 0
+        await self.ride_layer.group_add(
             self._ride_group_name(ride_id),
-            self.channel_name,
+            self.ride_channel,
         )
+        await cadence.add_subscriber(ride_id)
+        await self._notify_driver_cadence(ride_driver_id)
         await self.send_json({"status": "subscribed", "ride_id": ride_id})
 
+        # Last known position, possibly handed over by a drained worker.
+        snapshot = drain.rides.get(ride_id)
+        if snapshot is not None:
+            await self.send_json(snapshot)
+
+    async def _authorize_ride(self, ride_id: str):
+        """
+        Driver id of ``ride_id`` if this user may follow it, else ``None``.
+
+        Answered from the connection's copy of the user's rides; only a miss
+        goes back to the shared cache, and then to the DB (see ride_access).
+        Unknown and forbidden rides are reported the same way.
+        """
+        if self.user.is_staff:
+            return await self._get_ride_driver_id(ride_id)
+        if self.permitted_rides is None or ride_id not in self.permitted_rides:
+            self.permitted_rides = await ride_access.permitted_rides(self.user.id, ride_id)
+        return self.permitted_rides.get(ride_id)
+
+    async def _unsubscribe_ride(self):
+        ride_id, ride_driver_id = self.ride_id, self.ride_driver_id
+        self.ride_id = None
+        self.ride_driver_id = None
+        self.unacked.clear()
+        self.pending_updates.clear()
+        await self.ride_layer.group_discard(
+            self._ride_group_name(ride_id),
+            self.ride_channel,
+        )
+        await cadence.remove_subscriber(ride_id)
+        await self._notify_driver_cadence(ride_driver_id)
+
+    async def _attach_ride_layer(self):
+        """
+        Ride groups may live on their own channel layer (CHANNEL_LAYER_RIDES).
+        Then this socket gets a second channel there, and a task feeds what
+        arrives on it through the usual handlers.
+        """
+        self.ride_listener = None
+        if ride_channel_layer_alias() == self.channel_layer_alias:
+            self.ride_layer, self.ride_channel = self.channel_layer, self.channel_name
+            return
+        self.ride_layer = get_ride_channel_layer()
+        self.ride_channel = await self.ride_layer.new_channel()
+        self.ride_listener = asyncio.ensure_future(self._listen_ride_layer())
+
+    async def _listen_ride_layer(self):
+        while True:
+            message = await self.ride_layer.receive(self.ride_channel)
+            try:
+                await self.dispatch(message)
+            except Exception:
+                logger.exception("Failed to handle %s", message.get("type"))
+
+    async def _notify_driver_cadence(self, driver_id):
+        if driver_id is not None:
+            await self.channel_layer.group_send(
+                driver_group_name(driver_id),
+                {"type": "cadence_refresh"},
+            )
+
+    _ACTIVE_RIDE = object()
+
+    async def _push_cadence(self, ride=_ACTIVE_RIDE):
+        """
+        Tell the driver app how often to ping, if that changed.
+        """
+        if ride is self._ACTIVE_RIDE:
+            ride = await self._get_active_ride_for_driver(self.driver)
+        self.cadence_checked_at = time.monotonic()
+
+        subscribers = await cadence.subscriber_count(ride.ride_id) if ride else 0
+        interval_ms = cadence.choose_interval_ms(
+            ride.status if ride else None,
+            subscribers,
+            cadence.load_factor(),
+        )
+        if interval_ms != self.cadence_ms:
+            self.cadence_ms = interval_ms
+            await self.send_json({"event": "cadence", "interval_ms": interval_ms})
+
+    async def _handle_subscribe_geofence(self, content):
+        if not self.user.is_staff:
+            await self.send_json({"error": "Not allowed."})
+            return
+
+        try:
+            fence_id = int(content.get("fence_id"))
+        except (TypeError, ValueError):
+            await self.send_json({"error": "fence_id is required."})
+            return
+
+        self.geofence_subscriptions.add(fence_id)
+        await self.channel_layer.group_add(
+            geofence_group_name(fence_id),
+            self.channel_name,
+        )
+        await self.send_json({"status": "subscribed", "fence_id": fence_id})
+
+    async def _check_geofences(self, latitude: float, longitude: float, timestamp: str):
+        """
+        Emit enter/exit events for fences this fix crossed into or out of.
+        """
+        index = await geofence_registry.get_index()
+        inside = index.containing(latitude, longitude)
+        previous = self.geofences_inside
+        if inside == previous:
+            return
+        self.geofences_inside = inside
+
+        crossings = [(fence_id, "geofence_enter") for fence_id in inside - previous]
+        crossings += [(fence_id, "geofence_exit") for fence_id in previous - inside]
+        for fence_id, event in crossings:
+            fence = index.fences.get(fence_id)
+            await self.channel_layer.group_send(
+                geofence_group_name(fence_id),
+                {
+                    "type": "geofence_event",
+                    "data": {
+                        "event": event,
+                        "fence_id": fence_id,
+                        "fence_name": fence.name if fence else None,
+                        "driver_id": self.driver.id,
+                        "latitude": latitude,
+                        "longitude": longitude,
+                        "timestamp": timestamp,
+                    },
+                },
+            )
+
     async def location_update(self, event):
+        """
+        Deliver a location, with flow control for riders that ack.
+
+        A rider that subscribed with ``"ack": true`` confirms frames with
+        ``{"event": "ack", "ride_id": ..., "seq": ...}``. Once
+        ``TRACKING_RIDER_ACK_WINDOW`` frames are unconfirmed, only the newest
+        position per ride is held back, so a client that reads slowly gets
+        fewer, fresher frames instead of an ever growing backlog. A client
+        whose oldest unconfirmed frame is older than
+        ``TRACKING_SLOW_CONSUMER_SECONDS`` is disconnected.
+        """
+        if self.closing:
+            return
+        data = event["data"]
+        drain.rides.merge(data["ride_id"], data)
+
+        if not self.ack_window:
+            await self.send_json(data)
+            metrics.incr("rider.updates_delivered")
+            return
+
+        if self.unacked and time.monotonic() - self.unacked[0][2] > self._slow_consumer_seconds():
+            metrics.incr("rider.slow_disconnects")
+            logger.warning("Disconnecting slow consumer %s", self.channel_name)
+            self.closing = True
+            await self.close(code=4008)
+            return
+
+        if len(self.unacked) < self.ack_window:
+            await self._deliver(data)
+            return
+        if data["ride_id"] in self.pending_updates:
+            metrics.incr("rider.updates_conflated")
+        self.pending_updates[data["ride_id"]] = data
+
+    async def _handle_ack(self, content):
+        seq = content.get("seq")
+        if not isinstance(seq, int) or isinstance(seq, bool):
+            await self.send_json({"error": "seq is required."})
+            return
+
+        # An ack confirms that frame and every earlier one of the same ride.
+        ride_id = content.get("ride_id")
+        self.unacked = deque(
+            entry for entry in self.unacked if entry[0] != ride_id or entry[1] > seq
+        )
+        while self.pending_updates and len(self.unacked) < self.ack_window:
+            ride_id = next(iter(self.pending_updates))
+            await self._deliver(self.pending_updates.pop(ride_id))
+
+    async def _deliver(self, data):
+        await self.send_json(data)
+        self.unacked.append((data["ride_id"], data.get("seq", 0), time.monotonic()))
+        metrics.incr("rider.updates_delivered")
+
+    @staticmethod
+    def _ack_window() -> int:
+        return int(getattr(settings, "TRACKING_RIDER_ACK_WINDOW", 8))
+
+    @staticmethod
+    def _slow_consumer_seconds() -> float:
+        return float(getattr(settings, "TRACKING_SLOW_CONSUMER_SECONDS", 10))
+
+    async def geofence_event(self, event):
         await self.send_json(event["data"])
 
+    async def ride_status(self, event):
+        data = event["data"]
+        await self.send_json(data)
+
+        # Finished rides get no more updates; drop the subscription.
+        if data["status"] not in Ride.ACTIVE_STATUSES and self.permitted_rides:
+            self.permitted_rides.pop(data["ride_id"], None)
+        if data["status"] not in Ride.ACTIVE_STATUSES and data["ride_id"] == self.ride_id:
+            drain.rides.forget(data["ride_id"])
+            await self._unsubscribe_ride()
+
+    async def cadence_refresh(self, event):
+        if self.driver:
+            await self._push_cadence()
+
+    async def send_reconnect_hint(self, after_ms: int):
+        """Ask the client to come back to another worker in ``after_ms``."""
+        await self.send_json({"event": "reconnect", "after_ms": after_ms})
+        await self.close(code=1012)
+
     # --- UPDATED HELPER METHODS FOR ASYNC SAFETY ---
 
     async def _authenticate_user(self):
@@ -363,17 +698,33 @@ class TrackingConsumer(AsyncJsonWebsocketConsumer):
         )
 
     @database_sync_to_async
-    def _get_latest_ride_for_driver(self, driver: Driver):
+    def _get_active_ride_for_driver(self, driver: Driver):
+        return Ride.objects.active_for_driver(driver)
+
+    @database_sync_to_async
+    def _get_ride_driver_id(self, ride_id: str):
         return (
-            Ride.objects.filter(driver=driver)
-            .order_by("-created_at")
+            Ride.objects.filter(ride_id=ride_id)
+            .values_list("driver_id", flat=True)
             .first()
         )
 
-    @database_sync_to_async
-    def _ride_exists(self, ride_id: str) -> bool:
-        return Ride.objects.filter(ride_id=ride_id).exists()
+    @staticmethod
+    def _fix_time(timestamp) -> float:
+        """
+        Epoch seconds for a client timestamp, falling back to now if it is
+        missing or unparseable.
+        """
+        try:
+            fix_time = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+        except ValueError:
+            fix_time = None
+        if fix_time is None:
+            return timezone.now().timestamp()
+        if timezone.is_naive(fix_time):
+            fix_time = timezone.make_aware(fix_time, datetime.timezone.utc)
+        return fix_time.timestamp()
 
     @staticmethod
     def _ride_group_name(ride_id: str) -> str:
-        return f"ride_{ride_id}"
\ No newline at end of file
+        return ride_group_name(ride_id)
\ No newline at end of file
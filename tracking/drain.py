@@ -0,0 +1,213 @@
+"""
+Graceful drain of a WebSocket worker and hand-off of live ride state.
+
+Every worker keeps the last location it saw for each ride in ``rides``. A
+newly subscribed rider is sent that snapshot straight away, without a
+query. Frames are numbered from a per-ride counter in the shared cache, so
+the numbers keep rising when a driver moves to another worker or a worker
+restarts, and the newest frame always wins a merge.
+
+On ``TRACKING_DRAIN["signal"]`` (or a call to ``registry.drain()``) the
+worker:
+
+1. refuses new connections,
+2. publishes its ride snapshots to the ``tracking.state`` channel-layer
+   group, which every other worker listens on and merges by sequence, and
+3. tells each open socket to reconnect after a random delay within
+   ``reconnect_min_ms``..``reconnect_max_ms`` and closes it with 1012
+   (service restart), so the fleet reconnects spread out instead of all at
+   once.
+"""
+import asyncio
+import logging
+import random
+import signal
+from collections import OrderedDict
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_GROUP = "tracking.state"
+SEQ_CACHE_KEY = "tracking_ride_seq:%s"
+# Comfortably longer than any ride.
+SEQ_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+# Rides per hand-off message.
+HANDOFF_CHUNK = 500
+
+DEFAULT_DRAIN = {
+    "signal": "SIGUSR1",
+    "reconnect_min_ms": 1_000,
+    "reconnect_max_ms": 15_000,
+    # Rides kept in the snapshot store; the least recently updated go first.
+    "max_rides": 50_000,
+}
+
+
+def drain_settings() -> dict:
+    return {**DEFAULT_DRAIN, **getattr(settings, "TRACKING_DRAIN", {})}
+
+
+async def next_seq(ride_id: str) -> int:
+    """Next sequence number of ``ride_id``, shared by every worker."""
+    key = SEQ_CACHE_KEY % ride_id
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, SEQ_CACHE_TIMEOUT)
+        return await cache.aincr(key)
+
+
+class RideStateStore:
+    """
+    Last known location frame and sequence number per ride.
+    """
+
+    def __init__(self):
+        self._rides = OrderedDict()
+
+    async def record(self, ride_id: str, data: dict) -> dict:
+        """Store a new frame for ``ride_id`` and return it with its ``seq``."""
+        data = {**data, "seq": await next_seq(ride_id)}
+        self._put(ride_id, data)
+        return data
+
+    def merge(self, ride_id: str, data: dict) -> None:
+        """Keep ``data`` unless a frame with a higher ``seq`` is already stored."""
+        previous = self._rides.get(ride_id)
+        if previous is None or data.get("seq", 0) > previous["seq"]:
+            self._put(ride_id, data)
+
+    def get(self, ride_id: str):
+        return self._rides.get(ride_id)
+
+    def forget(self, ride_id: str) -> None:
+        self._rides.pop(ride_id, None)
+
+    def snapshot(self) -> dict:
+        return dict(self._rides)
+
+    def clear(self) -> None:
+        self._rides.clear()
+
+    def _put(self, ride_id: str, data: dict) -> None:
+        self._rides[ride_id] = data
+        self._rides.move_to_end(ride_id)
+        while len(self._rides) > drain_settings()["max_rides"]:
+            self._rides.popitem(last=False)
+
+
+class WorkerRegistry:
+    """
+    Per-process set of live consumers plus this worker's ``tracking.state``
+    listener.
+    """
+
+    def __init__(self):
+        self.consumers = set()
+        self.draining = False
+        self.channel_name = None
+        self._drain_started = False
+        self._listener = None
+        self._loop = None
+
+    async def register(self, consumer) -> None:
+        self.consumers.add(consumer)
+        # One listener per event loop; test runners start a fresh loop per test.
+        if (
+            self._listener is None
+            or self._listener.done()
+            or self._loop is not asyncio.get_running_loop()
+        ):
+            await self._start()
+
+    def unregister(self, consumer) -> None:
+        self.consumers.discard(consumer)
+
+    async def drain(self) -> None:
+        if self._drain_started:
+            return
+        self._drain_started = True
+        self.draining = True
+        config = drain_settings()
+        logger.info("Draining %d WebSocket connections", len(self.consumers))
+
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            # Several modest messages rather than one that may exceed what
+            # the layer (or Redis) will accept.
+            snapshot = list(rides.snapshot().items())
+            for start in range(0, len(snapshot), HANDOFF_CHUNK):
+                await channel_layer.group_send(
+                    STATE_GROUP,
+                    {
+                        "type": "ride_state.handoff",
+                        "origin": self.channel_name,
+                        "rides": dict(snapshot[start:start + HANDOFF_CHUNK]),
+                    },
+                )
+
+        for consumer in list(self.consumers):
+            after_ms = random.randint(config["reconnect_min_ms"], config["reconnect_max_ms"])
+            try:
+                await consumer.send_reconnect_hint(after_ms)
+            except Exception:
+                logger.exception("Failed to drain %s", consumer.channel_name)
+        metrics.incr("drain.sockets_closed", len(self.consumers))
+
+    def reset(self) -> None:
+        """Forget drain state; for tests."""
+        self.draining = False
+        self._drain_started = False
+        self.consumers.clear()
+
+    async def _start(self) -> None:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        # Default prefix on purpose: channels_redis serialises receives on all
+        # process-local channels behind one lock and only channels sharing a
+        # prefix share the BRPOP, so a separate prefix would make every
+        # socket's inbox wait behind this listener.
+        self.channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add(STATE_GROUP, self.channel_name)
+        self._loop = asyncio.get_running_loop()
+        self._listener = asyncio.ensure_future(self._listen(channel_layer))
+
+    async def _listen(self, channel_layer) -> None:
+        while True:
+            message = await channel_layer.receive(self.channel_name)
+            if message.get("type") != "ride_state.handoff" or message.get("origin") == self.channel_name:
+                continue
+            for ride_id, data in message["rides"].items():
+                rides.merge(ride_id, data)
+            metrics.incr("drain.rides_received", len(message["rides"]))
+
+    def install_signal_handler(self) -> None:
+        """
+        Drain on ``TRACKING_DRAIN["signal"]``. Called once at startup from
+        TrackingConfig.ready(), before any event loop exists.
+        """
+        name = drain_settings()["signal"]
+        if not name:
+            return
+        try:
+            signal.signal(getattr(signal, name), self._on_signal)
+        except (ValueError, OSError, AttributeError):
+            # Not on the main thread, or the platform lacks the signal.
+            logger.info("Could not install %s drain handler", name)
+
+    def _on_signal(self, signum, frame) -> None:
+        # Refuse new sockets at once, even if no loop has started yet.
+        self.draining = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.drain()))
+
+
+rides = RideStateStore()
+registry = WorkerRegistry()
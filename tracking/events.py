@@ -0,0 +1,50 @@
+"""
+Channel-layer group names and the events the REST side pushes to sockets.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+def ride_group_name(ride_id: str) -> str:
+    return f"ride_{ride_id}"
+
+
+def driver_group_name(driver_id: int) -> str:
+    return f"driver_{driver_id}"
+
+
+def ride_channel_layer_alias() -> str:
+    return getattr(settings, "TRACKING_RIDE_CHANNEL_LAYER", "default")
+
+
+def get_ride_channel_layer():
+    """The channel layer that carries ride groups (see CHANNEL_LAYER_RIDES)."""
+    return get_channel_layer(ride_channel_layer_alias())
+
+
+def broadcast_ride_status(ride) -> None:
+    """
+    Tell everyone subscribed to a ride that its status changed. Consumers stop
+    forwarding location updates for the ride once it is no longer active, and
+    the driver's socket re-evaluates its ping cadence.
+    """
+    channel_layer = get_channel_layer()
+    ride_layer = get_ride_channel_layer()
+    if channel_layer is None or ride_layer is None:
+        return
+    async_to_sync(ride_layer.group_send)(
+        ride_group_name(ride.ride_id),
+        {
+            "type": "ride_status",
+            "data": {
+                "event": "ride_status",
+                "ride_id": ride.ride_id,
+                "status": ride.status,
+            },
+        },
+    )
+    async_to_sync(channel_layer.group_send)(
+        driver_group_name(ride.driver_id),
+        {"type": "cadence_refresh"},
+    )
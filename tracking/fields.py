@@ -0,0 +1,40 @@
+from django import forms
+from django.db import models
+
+MICRODEGREES_PER_DEGREE = 1_000_000
+
+
+class MicrodegreeField(models.IntegerField):
+    """
+    A latitude/longitude in degrees, stored as an int32 count of microdegrees.
+
+    Python code reads and writes plain floats (``12.971599``); the column is a
+    4-byte integer instead of a ``numeric(9, 6)``. Microdegrees keep the same
+    six decimal places the old DecimalField had (~0.11 m at the equator), and
+    converting is a multiply/divide rather than a Decimal round trip.
+    """
+
+    description = "Coordinate in degrees stored as integer microdegrees"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return value / MICRODEGREES_PER_DEGREE
+
+    def to_python(self, value):
+        if value is None or isinstance(value, float):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return super().to_python(value)
+
+    def get_prep_value(self, value):
+        # Skip IntegerField's int() cast; the value is still in degrees here.
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        return round(float(value) * MICRODEGREES_PER_DEGREE)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{"form_class": forms.FloatField, **kwargs})
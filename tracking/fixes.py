@@ -0,0 +1,194 @@
+"""
+Validation and smoothing of incoming GPS fixes.
+
+Every driver connection owns a ``FixPipeline`` built from
+``TRACKING_FIX_FILTERS`` (same shape as ``AUTH_PASSWORD_VALIDATORS``). Each
+filter sees the fix and the last accepted fix from that driver, and either
+passes it on (possibly adjusted) or rejects it with a reason. Rejected fixes
+never reach the database or the channel layer; every outcome is counted in
+``tracking.metrics`` as ``fix.accepted`` or ``fix.rejected.<reason>``.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .geo import haversine_m
+
+
+class Fix:
+    __slots__ = ("latitude", "longitude", "at", "accuracy_m")
+
+    def __init__(self, latitude: float, longitude: float, at: float, accuracy_m: float | None = None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.at = at
+        self.accuracy_m = accuracy_m
+
+
+class FixRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class BaseFixFilter:
+    def process(self, fix: Fix, previous: Fix | None) -> Fix:
+        """Return the (possibly adjusted) fix or raise ``FixRejected``."""
+        raise NotImplementedError("subclasses of BaseFixFilter must override process()")
+
+
+class RangeFilter(BaseFixFilter):
+    """Rejects non-finite or out-of-range coordinates, and optionally (0, 0)."""
+
+    def __init__(self, reject_null_island: bool = True):
+        self.reject_null_island = reject_null_island
+
+    def process(self, fix, previous):
+        if not (math.isfinite(fix.latitude) and math.isfinite(fix.longitude)):
+            raise FixRejected("out_of_range")
+        if not (-90 <= fix.latitude <= 90 and -180 <= fix.longitude <= 180):
+            raise FixRejected("out_of_range")
+        if self.reject_null_island and fix.latitude == 0 and fix.longitude == 0:
+            raise FixRejected("out_of_range")
+        return fix
+
+
+class MonotonicTimestampFilter(BaseFixFilter):
+    """Rejects fixes older than the last accepted one, or too far in the future."""
+
+    def __init__(self, max_future_skew_s: float = 30):
+        self.max_future_skew_s = max_future_skew_s
+
+    def process(self, fix, previous):
+        if previous is not None and fix.at <= previous.at:
+            raise FixRejected("out_of_order")
+        if fix.at > time.time() + self.max_future_skew_s:
+            raise FixRejected("future_timestamp")
+        return fix
+
+
+class MaxSpeedFilter(BaseFixFilter):
+    """
+    Rejects fixes implying the driver moved faster than ``max_speed_kmh``.
+
+    If the last accepted fix was itself the outlier, every real fix after it
+    looks impossible; so after ``reanchor_after`` rejections in a row the
+    next fix is accepted and becomes the new anchor.
+    """
+
+    def __init__(self, max_speed_kmh: float = 200, reanchor_after: int = 3):
+        self.max_speed_mps = max_speed_kmh / 3.6
+        self.reanchor_after = reanchor_after
+        self._rejected = 0
+
+    def process(self, fix, previous):
+        if previous is None:
+            return fix
+        elapsed = fix.at - previous.at
+        distance = haversine_m(previous.latitude, previous.longitude, fix.latitude, fix.longitude)
+        if elapsed <= 0 or distance / elapsed > self.max_speed_mps:
+            if self._rejected < self.reanchor_after:
+                self._rejected += 1
+                raise FixRejected("impossible_speed")
+            metrics.incr("fix.reanchored")
+        self._rejected = 0
+        return fix
+
+
+class JitterFilter(BaseFixFilter):
+    """
+    Drops fixes that moved less than ``min_distance_m`` from the last accepted
+    one, unless ``heartbeat_s`` has passed (so a parked driver still shows as
+    live now and then).
+    """
+
+    def __init__(self, min_distance_m: float = 3, heartbeat_s: float = 30):
+        self.min_distance_m = min_distance_m
+        self.heartbeat_s = heartbeat_s
+
+    def process(self, fix, previous):
+        if previous is None or fix.at - previous.at >= self.heartbeat_s:
+            return fix
+        distance = haversine_m(previous.latitude, previous.longitude, fix.latitude, fix.longitude)
+        if distance < self.min_distance_m:
+            raise FixRejected("jitter")
+        return fix
+
+
+class KalmanSmoother(BaseFixFilter):
+    """
+    Constant-position Kalman filter over latitude/longitude.
+
+    Process noise grows with time (``speed_mps`` of assumed movement per
+    second); measurement noise is the fix's reported accuracy, or
+    ``default_accuracy_m``. Never rejects, only adjusts coordinates.
+    """
+
+    def __init__(self, speed_mps: float = 3, default_accuracy_m: float = 10):
+        self.speed_mps = speed_mps
+        self.default_accuracy_m = default_accuracy_m
+        self._variance = None
+        self._latitude = None
+        self._longitude = None
+        self._at = None
+
+    def process(self, fix, previous):
+        accuracy = max(fix.accuracy_m or self.default_accuracy_m, 1.0)
+        if self._variance is None:
+            self._latitude, self._longitude = fix.latitude, fix.longitude
+            self._variance = accuracy * accuracy
+        else:
+            elapsed = max(fix.at - self._at, 0)
+            self._variance += elapsed * self.speed_mps * self.speed_mps
+            gain = self._variance / (self._variance + accuracy * accuracy)
+            self._latitude += gain * (fix.latitude - self._latitude)
+            self._longitude += gain * (fix.longitude - self._longitude)
+            self._variance *= 1 - gain
+        self._at = fix.at
+
+        fix.latitude = self._latitude
+        fix.longitude = self._longitude
+        return fix
+
+
+DEFAULT_FIX_FILTERS = [
+    {"NAME": "tracking.fixes.RangeFilter"},
+    {"NAME": "tracking.fixes.MonotonicTimestampFilter"},
+    {"NAME": "tracking.fixes.MaxSpeedFilter"},
+    {"NAME": "tracking.fixes.JitterFilter"},
+]
+
+
+def build_filters(config=None) -> list[BaseFixFilter]:
+    if config is None:
+        config = getattr(settings, "TRACKING_FIX_FILTERS", DEFAULT_FIX_FILTERS)
+    return [import_string(entry["NAME"])(**entry.get("OPTIONS", {})) for entry in config]
+
+
+class FixPipeline:
+    """
+    Per-driver chain of fix filters. ``process()`` returns the accepted fix,
+    or ``None`` and records the rejection reason in ``rejected_reason``.
+    """
+
+    def __init__(self, filters=None):
+        self.filters = build_filters() if filters is None else filters
+        self.last_accepted: Fix | None = None
+        self.rejected_reason: str | None = None
+
+    def process(self, fix: Fix) -> Fix | None:
+        self.rejected_reason = None
+        try:
+            for fix_filter in self.filters:
+                fix = fix_filter.process(fix, self.last_accepted)
+        except FixRejected as exc:
+            self.rejected_reason = exc.reason
+            metrics.incr(f"fix.rejected.{exc.reason}")
+            return None
+
+        metrics.incr("fix.accepted")
+        self.last_accepted = fix
+        return fix
@@ -0,0 +1,192 @@
+"""
+In-memory geofence matching for the driver location stream.
+
+Active ``Geofence`` rows are loaded into a ``GeofenceIndex``: a uniform grid
+of ``cell_size``-degree cells, each holding the fences whose bounding box
+touches it. A fix only tests the fences registered in its own cell, so the
+cost per fix depends on how many fences overlap that spot, not on how many
+exist in total.
+
+Each worker keeps one index. Saving or deleting a fence bumps a version
+number in the shared cache; workers notice within
+``TRACKING_GEOFENCE_REFRESH_SECONDS`` and reload in the background while the
+old index keeps serving fixes.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+from .geo import METERS_PER_DEGREE_LAT, haversine_m, point_in_polygon
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = "tracking_geofence_version"
+# Upper bound on grid cells one fence may occupy, whatever its stored shape.
+MAX_FENCE_CELLS = 10_000
+
+
+def max_span_degrees() -> float:
+    """Widest latitude or longitude extent a fence's bounding box may have."""
+    return float(getattr(settings, "TRACKING_GEOFENCE_MAX_SPAN_DEGREES", 1.0))
+
+
+def geofence_group_name(fence_id: int) -> str:
+    return f"geofence_{fence_id}"
+
+
+class Fence:
+    __slots__ = ("id", "name", "kind", "center", "radius_m", "vertices", "bbox")
+
+    def __init__(self, id, name, kind, center=None, radius_m=None, vertices=None):
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.center = center
+        self.radius_m = radius_m
+        self.vertices = [tuple(vertex) for vertex in vertices or ()]
+
+        if kind == "circle":
+            lat, lon = center
+            dlat = radius_m / METERS_PER_DEGREE_LAT
+            dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+            self.bbox = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        else:
+            lats = [vertex[0] for vertex in self.vertices]
+            lons = [vertex[1] for vertex in self.vertices]
+            self.bbox = (min(lats), min(lons), max(lats), max(lons))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        if self.kind == "circle":
+            return haversine_m(lat, lon, *self.center) <= self.radius_m
+        return point_in_polygon(lat, lon, self.vertices)
+
+
+class GeofenceIndex:
+    def __init__(self, fences=(), cell_size: float = 0.05, version=None):
+        self.cell_size = cell_size
+        self.version = version
+        self.fences = {}
+        self._cells = defaultdict(list)
+        for fence in fences:
+            self.add(fence)
+
+    def _cell(self, lat: float, lon: float):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def add(self, fence: Fence) -> None:
+        min_lat, min_lon, max_lat, max_lon = fence.bbox
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > MAX_FENCE_CELLS:
+            raise ValueError(f"Fence {fence.id} covers too many grid cells")
+        self.fences[fence.id] = fence
+        for i in range(lat_lo, lat_hi + 1):
+            for j in range(lon_lo, lon_hi + 1):
+                self._cells[(i, j)].append(fence)
+
+    def containing(self, lat: float, lon: float) -> frozenset:
+        """Ids of every fence that contains the point."""
+        candidates = self._cells.get(self._cell(lat, lon))
+        if not candidates:
+            return frozenset()
+        return frozenset(fence.id for fence in candidates if fence.contains(lat, lon))
+
+
+def load_index(version=None) -> GeofenceIndex:
+    from .models import Geofence
+
+    index = GeofenceIndex(
+        cell_size=float(getattr(settings, "TRACKING_GEOFENCE_CELL_DEGREES", 0.05)),
+        version=version,
+    )
+    for row in Geofence.objects.filter(is_active=True).iterator():
+        # Rows saved before validation existed (or edited by hand) must not
+        # take the index, and with it every driver_location, down.
+        try:
+            row.clean()
+            index.add(fence_from_row(row))
+        except (ValidationError, TypeError, ValueError, IndexError):
+            logger.warning("Skipping invalid geofence %s", row.id)
+    return index
+
+
+def fence_from_row(row) -> Fence:
+    if row.kind == "circle":
+        return Fence(
+            row.id,
+            row.name,
+            row.kind,
+            center=(row.center_latitude, row.center_longitude),
+            radius_m=row.radius_m,
+        )
+    return Fence(row.id, row.name, row.kind, vertices=row.vertices)
+
+
+def bump_version() -> None:
+    cache.add(VERSION_CACHE_KEY, 0, None)
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+class GeofenceRegistry:
+    """
+    Per-process holder of the current ``GeofenceIndex``.
+
+    At most one reload runs at a time; callers arriving during a cold start
+    wait on it instead of starting their own. A reload that fails is logged
+    and the previous index keeps serving (an empty one if there is none yet).
+    """
+
+    def __init__(self):
+        self._index = None
+        self._checked_at = 0.0
+        self._refreshing = None
+        # Bumped by clear() so a reload started before it can't install its
+        # now outdated result.
+        self._generation = 0
+
+    async def get_index(self) -> GeofenceIndex:
+        if self._index is None or time.monotonic() - self._checked_at >= self._refresh_seconds():
+            if self._refreshing is None or self._refreshing.done():
+                self._refreshing = asyncio.ensure_future(self._refresh())
+            if self._index is None:
+                # Shielded so one cancelled caller doesn't cancel everyone's load.
+                await asyncio.shield(self._refreshing)
+        return self._index if self._index is not None else GeofenceIndex()
+
+    def clear(self) -> None:
+        self._index = None
+        self._generation += 1
+
+    @staticmethod
+    def _refresh_seconds() -> float:
+        return float(getattr(settings, "TRACKING_GEOFENCE_REFRESH_SECONDS", 5))
+
+    async def _refresh(self) -> None:
+        self._checked_at = time.monotonic()
+        generation = self._generation
+        try:
+            version = await cache.aget(VERSION_CACHE_KEY, 0)
+            if self._index is not None and self._index.version == version:
+                return
+            index = await database_sync_to_async(load_index)(version)
+        except Exception:
+            logger.exception("Could not reload geofences; keeping the previous index")
+            return
+        if generation == self._generation:
+            self._index = index
+
+
+registry = GeofenceRegistry()
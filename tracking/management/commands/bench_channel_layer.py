@@ -0,0 +1,118 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+def _frame(ride: int, seq: int) -> dict:
+    # Same shape as the location_update events TrackingConsumer fans out.
+    return {
+        "type": "location_update",
+        "sent_at": time.perf_counter(),
+        "data": {
+            "driver_id": ride,
+            "ride_id": f"RIDE-{ride}",
+            "latitude": 12.9715987,
+            "longitude": 77.594566,
+            "timestamp": "2026-01-01T00:00:00+00:00",
+            "progress": {"distance_remaining_m": 1200.0, "eta_seconds": 180},
+            "seq": seq,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare channel layer presets (CHANNEL_LAYER_PRESETS) on the ride "
+        "fan-out workload: drivers sending location frames to ride groups with a "
+        "few subscribed sockets each. Reports send rate, delivery and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--presets",
+            default=",".join(settings.CHANNEL_LAYER_PRESETS),
+            help="Comma-separated preset names to run.",
+        )
+        parser.add_argument("--rides", type=int, default=200)
+        parser.add_argument("--subscribers", type=int, default=2, help="Sockets per ride.")
+        parser.add_argument("--frames", type=int, default=20, help="Frames per ride.")
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=10.0,
+            help="Seconds to wait for deliveries once sending is done.",
+        )
+
+    def handle(self, *args, **options):
+        presets = [name.strip() for name in options["presets"].split(",") if name.strip()]
+        unknown = set(presets) - set(settings.CHANNEL_LAYER_PRESETS)
+        if unknown:
+            raise CommandError(f"Unknown presets: {', '.join(sorted(unknown))}")
+
+        for name in presets:
+            config = settings.CHANNEL_LAYER_PRESETS[name]
+            layer = import_string(config["BACKEND"])(**config.get("CONFIG", {}))
+            try:
+                result = asyncio.run(self._run(layer, options))
+            except Exception as exc:
+                self.stdout.write(f"{name:>8}: skipped ({exc.__class__.__name__}: {exc})")
+                continue
+            self.stdout.write(
+                f"{name:>8}: {result['sent']} frames in {result['send_s']:.2f}s "
+                f"({result['sent'] / result['send_s']:8.0f} sends/s), "
+                f"delivered {result['delivered']}/{result['expected']}, "
+                f"latency p50 {result['p50_ms']:.1f} ms p99 {result['p99_ms']:.1f} ms"
+            )
+
+    async def _run(self, layer, options) -> dict:
+        rides, frames = options["rides"], options["frames"]
+        run_id = uuid.uuid4().hex[:8]
+        groups = [f"bench_{run_id}_ride_{ride}" for ride in range(rides)]
+        members = []
+        for group in groups:
+            for _ in range(options["subscribers"]):
+                channel = await layer.new_channel()
+                await layer.group_add(group, channel)
+                members.append((group, channel))
+
+        latencies = []
+
+        async def read(channel):
+            for _ in range(frames):
+                message = await layer.receive(channel)
+                latencies.append(time.perf_counter() - message["sent_at"])
+
+        readers = [asyncio.ensure_future(read(channel)) for _group, channel in members]
+
+        started = time.perf_counter()
+        for seq in range(1, frames + 1):
+            # Every driver sends its next frame at about the same time.
+            await asyncio.gather(
+                *(layer.group_send(group, _frame(ride, seq)) for ride, group in enumerate(groups))
+            )
+        send_s = time.perf_counter() - started
+
+        _done, pending = await asyncio.wait(readers, timeout=options["timeout"])
+        for reader in pending:
+            reader.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        for group, channel in members:
+            await layer.group_discard(group, channel)
+        if hasattr(layer, "close_pools"):
+            await layer.close_pools()
+
+        latencies.sort()
+        return {
+            "sent": rides * frames,
+            "send_s": send_s,
+            "expected": len(members) * frames,
+            "delivered": len(latencies),
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        }
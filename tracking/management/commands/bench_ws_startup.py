@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so imports aren't already cached. The timer
+# starts before anything from the project is imported.
+PROBE = """
+import time
+started = time.perf_counter()
+import importlib, sys
+application = importlib.import_module(sys.argv[1]).application
+import_s = time.perf_counter() - started
+modules = len(sys.modules)
+
+import asyncio, json
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken
+
+token = AccessToken.for_user(get_user_model().objects.get(pk=int(sys.argv[2])))
+
+async def connect(count):
+    timings = []
+    for _ in range(count):
+        communicator = WebsocketCommunicator(application, f"/ws/tracking/?token={token}")
+        begun = time.perf_counter()
+        connected, _ = await communicator.connect()
+        timings.append(time.perf_counter() - begun)
+        assert connected, "connection refused"
+        await communicator.disconnect()
+    return timings
+
+timings = asyncio.run(connect(int(sys.argv[3])))
+print(json.dumps({"import_s": import_s, "modules": modules, "connect_s": timings}))
+"""
+
+PROFILES = {
+    "full": ("backend.asgi", "backend.settings"),
+    "ws": ("backend.asgi_ws", "backend.settings_ws"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full ASGI profile (backend.asgi) with the WebSocket-only one "
+        "(backend.asgi_ws): time to import the application in a fresh process, "
+        "modules loaded, and latency of authenticated /ws/tracking/ connects."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh processes per profile.")
+        parser.add_argument("--connects", type=int, default=50, help="Connects per process.")
+        for name, (_module, settings_module) in PROFILES.items():
+            parser.add_argument(
+                f"--{name}-settings",
+                default=settings_module,
+                help=f"Settings module for the {name} profile.",
+            )
+
+    def handle(self, *args, **options):
+        user, _created = get_user_model().objects.get_or_create(phone_number="+910000000000")
+
+        for name, (module, _settings_module) in PROFILES.items():
+            env = {**os.environ, "DJANGO_SETTINGS_MODULE": options[f"{name}_settings"]}
+            imports, modules, connects = [], [], []
+            for _ in range(options["runs"]):
+                result = subprocess.run(
+                    [sys.executable, "-c", PROBE, module, str(user.pk), str(options["connects"])],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                )
+                if result.returncode:
+                    raise CommandError(f"{name} profile failed:\n{result.stderr}")
+                data = json.loads(result.stdout.strip().splitlines()[-1])
+                imports.append(data["import_s"])
+                modules.append(data["modules"])
+                connects.extend(data["connect_s"])
+
+            connects.sort()
+            self.stdout.write(
+                f"{name:>5}: import {statistics.median(imports) * 1000:6.0f} ms, "
+                f"{statistics.median(modules):5.0f} modules, "
+                f"connect p50 {statistics.median(connects) * 1000:.2f} ms "
+                f"p99 {connects[int(len(connects) * 0.99) - 1] * 1000:.2f} ms"
+            )
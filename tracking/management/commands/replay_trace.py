@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from channels.routing import get_default_application
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tracking import metrics
+from tracking.models import Driver
+from tracking.trace import LOCATION, SUBSCRIBE, TraceReader
+
+ACK_STATUSES = {"location_updated", "location_rejected"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded traces (TRACKING_TRACE_PATH) through TrackingConsumer, one "
+        "virtual socket per recorded driver and rider, at 1x, 10x or max speed. "
+        "Reports throughput and per-stage latencies so configurations can be "
+        "compared on identical traffic. Runs in-process against ASGI_APPLICATION, "
+        "the configured channel layer and the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Trace files; merged by time.")
+        parser.add_argument(
+            "--speed",
+            default="1",
+            help='Playback speed factor, e.g. 1 or 10, or "max" to send without pauses.',
+        )
+        parser.add_argument(
+            "--drivers",
+            type=int,
+            default=0,
+            help="Replay only the first N drivers in the trace (0 = all).",
+        )
+        parser.add_argument(
+            "--no-subscribers",
+            action="store_true",
+            help="Skip the recorded subscribe_ride frames.",
+        )
+        parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait per ack.")
+
+    def handle(self, *args, **options):
+        if options["speed"] == "max":
+            speed = None
+        else:
+            try:
+                speed = float(options["speed"])
+            except ValueError:
+                raise CommandError('--speed must be a number or "max".')
+            if speed <= 0:
+                raise CommandError("--speed must be positive.")
+
+        readers = [TraceReader(path) for path in options["paths"]]
+        locations = defaultdict(list)
+        subscriptions = defaultdict(list)
+        for record in heapq.merge(*readers, key=lambda record: record.at):
+            if record.kind == LOCATION:
+                locations[record.actor].append(record)
+            elif record.kind == SUBSCRIBE and not options["no_subscribers"]:
+                subscriptions[record.actor].append(record)
+        if not locations:
+            raise CommandError("The trace has no driver_location records.")
+
+        driver_ids = list(locations)[: options["drivers"] or None]
+        drivers = Driver.objects.select_related("user").in_bulk(driver_ids)
+        riders = get_user_model().objects.in_bulk(list(subscriptions))
+        missing = len(driver_ids) - len(drivers)
+        if missing:
+            self.stderr.write(f"Skipping {missing} drivers that don't exist in this database.")
+        if not drivers:
+            raise CommandError("None of the traced drivers exist in this database.")
+
+        records = [record for driver_id in drivers for record in locations[driver_id]]
+        self.t0 = min(record.at for record in records)
+        # Shift client timestamps so the newest lands on "now": gaps between
+        # fixes (what the filters look at) stay as recorded, none are future.
+        client_times = [record.client_ts or record.at for record in records]
+        self.ts_shift = time.time() - max(client_times)
+        self.speed = speed
+        self.timeout = options["timeout"]
+        self.sent_at = {}
+
+        metrics.reset()
+        started = time.perf_counter()
+        results = asyncio.run(
+            self._replay(
+                [(drivers[driver_id], locations[driver_id]) for driver_id in drivers],
+                [(riders[user_id], subscriptions[user_id]) for user_id in riders],
+            )
+        )
+        elapsed = time.perf_counter() - started
+        self._report(results, len(records), elapsed)
+
+    async def _replay(self, drivers, riders):
+        self.application = get_default_application()
+        self.loop_start = asyncio.get_running_loop().time() + 0.5
+        self.done = asyncio.Event()
+
+        rider_tasks = [asyncio.ensure_future(self._rider(user, records)) for user, records in riders]
+        driver_results = await asyncio.gather(
+            *(self._driver(driver, records) for driver, records in drivers)
+        )
+        # Give riders a moment for the last frames, then stop them.
+        await asyncio.sleep(min(self.timeout, 1.0))
+        self.done.set()
+        rider_results = await asyncio.gather(*rider_tasks)
+        return {"drivers": driver_results, "riders": rider_results}
+
+    async def _wait_until(self, at: float) -> None:
+        if self.speed is None:
+            return
+        delay = self.loop_start + (at - self.t0) / self.speed - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _connect(self, user) -> WebsocketCommunicator:
+        communicator = WebsocketCommunicator(
+            self.application, f"/ws/tracking/?token={AccessToken.for_user(user)}"
+        )
+        connected, _ = await communicator.connect(timeout=self.timeout)
+        if not connected:
+            raise CommandError(f"Socket for user {user.pk} was refused.")
+        return communicator
+
+    async def _driver(self, driver, records) -> dict:
+        result = {"sent": 0, "accepted": 0, "rejected": 0, "lag_s": 0.0, "aborted": False}
+        await self._wait_until(records[0].at)
+        socket = await self._connect(driver.user)
+        await socket.send_json_to({"event": "driver_identify", "driver_id": driver.id})
+        while True:
+            reply = await socket.receive_json_from(self.timeout)
+            if "error" in reply:
+                # Nothing this socket sends would be accepted; don't wait it out.
+                self.stderr.write(f"Driver {driver.id} aborted: {reply['error']}")
+                result["aborted"] = True
+                await socket.disconnect()
+                return result
+            if "status" in reply:
+                break
+
+        for record in records:
+            await self._wait_until(record.at)
+            timestamp = datetime.fromtimestamp(
+                (record.client_ts or record.at) + self.ts_shift, tz=timezone.utc
+            ).isoformat()
+            frame = {
+                "event": "driver_location",
+                "latitude": record.latitude,
+                "longitude": record.longitude,
+                "timestamp": timestamp,
+            }
+            if record.accuracy is not None:
+                frame["accuracy"] = record.accuracy
+
+            sent = time.perf_counter()
+            self.sent_at[(driver.id, timestamp)] = sent
+            await socket.send_json_to(frame)
+            while True:
+                reply = await socket.receive_json_from(self.timeout)
+                if reply.get("status") in ACK_STATUSES or "error" in reply:
+                    break
+            metrics.observe("replay.ack", time.perf_counter() - sent)
+            result["sent"] += 1
+            result["accepted" if reply.get("status") == "location_updated" else "rejected"] += 1
+
+            if self.speed is not None:
+                due = self.loop_start + (record.at - self.t0) / self.speed
+                result["lag_s"] = max(result["lag_s"], asyncio.get_running_loop().time() - due)
+
+        await socket.disconnect()
+        return result
+
+    async def _rider(self, user, records) -> dict:
+        await self._wait_until(records[0].at)
+        socket = await self._connect(user)
+        result = {"frames": 0, "aborted": False}
+
+        async def read():
+            while True:
+                frame = await socket.receive_json_from(timeout=3600)
+                if "error" in frame:
+                    self.stderr.write(f"Rider {user.pk} aborted: {frame['error']}")
+                    result["aborted"] = True
+                    return
+                sent = self.sent_at.get((frame.get("driver_id"), frame.get("timestamp")))
+                if sent is not None:
+                    metrics.observe("replay.delivery", time.perf_counter() - sent)
+                    result["frames"] += 1
+
+        reader = asyncio.ensure_future(read())
+        for record in records:
+            await self._wait_until(record.at)
+            if reader.done():
+                break
+            await socket.send_json_to({"event": "subscribe_ride", "ride_id": record.ride_id})
+        # Until the drivers are done, or straight away if the reader aborted.
+        finished = asyncio.ensure_future(self.done.wait())
+        await asyncio.wait((reader, finished), return_when=asyncio.FIRST_COMPLETED)
+        finished.cancel()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await socket.disconnect()
+        return result
+
+    def _report(self, results, total: int, elapsed: float) -> None:
+        drivers = results["drivers"]
+        sent = sum(result["sent"] for result in drivers)
+        accepted = sum(result["accepted"] for result in drivers)
+        self.stdout.write(
+            f"Replayed {sent}/{total} fixes from {len(drivers)} drivers and "
+            f"{len(results['riders'])} riders in {elapsed:.2f}s ({sent / elapsed:.0f} fixes/s); "
+            f"{accepted} accepted, {sent - accepted} rejected, "
+            f"{sum(result['frames'] for result in results['riders'])} frames delivered"
+        )
+        aborted = sum(result["aborted"] for result in drivers + results["riders"])
+        if aborted:
+            self.stdout.write(f"{aborted} sockets aborted on error replies")
+        if self.speed is not None:
+            lag = max((result["lag_s"] for result in drivers), default=0.0)
+            self.stdout.write(f"Worst schedule lag: {lag * 1000:.0f} ms")
+
+        self.stdout.write(f"{'stage':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, stats in sorted(metrics.timings().items()):
+            self.stdout.write(
+                f"{name:<22}{stats['count']:>8}{stats['p50_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+            )
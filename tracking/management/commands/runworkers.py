@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking import metrics
+
+DEFAULT_WORKERS = {
+    # 0 = one worker per CPU this process may run on.
+    "count": 0,
+    # Size of each worker's sync thread pool (ASGI_THREADS); 0 = asyncio default.
+    "threads": 0,
+    "pin": False,
+    "metrics_dir": os.path.join(tempfile.gettempdir(), "tracking-workers"),
+    "metrics_interval": 5.0,
+}
+
+
+def _available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _reuseport_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class Command(BaseCommand):
+    help = (
+        "Run N Daphne worker processes on one port. Each worker is a fresh "
+        "interpreter (not a fork, which would share the parent's Twisted reactor "
+        "and event loop) that binds its own SO_REUSEPORT socket, so the kernel "
+        "spreads connections across them and they share nothing but the channel "
+        "layer and cache. Workers that die are restarted; SIGUSR1 is passed on to "
+        "drain them (see tracking.drain)."
+    )
+
+    def add_arguments(self, parser):
+        config = {**DEFAULT_WORKERS, **getattr(settings, "TRACKING_WORKERS", {})}
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--backlog", type=int, default=2048)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=config["count"],
+            help="Number of worker processes (0 = one per available CPU).",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=config["threads"],
+            help="Sync thread pool size per worker, exported as ASGI_THREADS.",
+        )
+        parser.add_argument(
+            "--pin",
+            action="store_true",
+            default=config["pin"],
+            help="Pin worker i to the i-th available CPU.",
+        )
+        parser.add_argument(
+            "--metrics-dir",
+            default=config["metrics_dir"],
+            help="Where workers write their counters and the parent writes the totals.",
+        )
+        parser.add_argument(
+            "--metrics-interval",
+            type=float,
+            default=config["metrics_interval"],
+            help="Seconds between metric dumps; a worker silent for 3x this is unhealthy.",
+        )
+        # Set on the processes the parent starts; not meant to be used by hand.
+        parser.add_argument("--serve-worker", type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise CommandError("SO_REUSEPORT is not available on this platform.")
+
+        self.options = options
+        self.cpus = _available_cpus()
+        if options["serve_worker"] is not None:
+            self._run_worker(options["serve_worker"])
+            return
+
+        count = options["workers"] or len(self.cpus)
+        os.makedirs(options["metrics_dir"], exist_ok=True)
+
+        # Fail here, not in every child, if the port is taken.
+        try:
+            _reuseport_socket(options["host"], options["port"], 1).close()
+        except OSError as exc:
+            raise CommandError(f"Cannot bind {options['host']}:{options['port']}: {exc}")
+
+        self.children = {}
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGUSR1, self._forward)
+
+        for index in range(count):
+            self._spawn(index)
+        self.stdout.write(
+            f"Started {count} workers on {options['host']}:{options['port']} "
+            f"(metrics in {options['metrics_dir']})"
+        )
+
+        next_report = time.monotonic() + options["metrics_interval"]
+        while self.children:
+            self._reap()
+            if time.monotonic() >= next_report:
+                self._aggregate(count)
+                next_report = time.monotonic() + options["metrics_interval"]
+            time.sleep(0.2)
+        self.stdout.write("All workers exited.")
+
+    def _spawn(self, index: int) -> None:
+        options = self.options
+        env = dict(os.environ)
+        # daphne.server reads this when it is imported, which happens during
+        # django.setup() in the new process, so it has to be in its environment.
+        if options["threads"]:
+            env["ASGI_THREADS"] = str(options["threads"])
+        command = [
+            sys.executable,
+            os.path.abspath(sys.argv[0]),
+            "runworkers",
+            f"--serve-worker={index}",
+            f"--host={options['host']}",
+            f"--port={options['port']}",
+            f"--backlog={options['backlog']}",
+            f"--metrics-dir={options['metrics_dir']}",
+            f"--metrics-interval={options['metrics_interval']}",
+            f"--verbosity={options['verbosity']}",
+        ]
+        if options["pin"]:
+            command.append("--pin")
+        if options.get("settings"):
+            command.append(f"--settings={options['settings']}")
+        if options.get("pythonpath"):
+            command.append(f"--pythonpath={options['pythonpath']}")
+        # An ignored signal stays ignored across exec, so a SIGUSR1 forwarded
+        # before TrackingConfig.ready() installs the drain handler doesn't
+        # kill the worker.
+        process = subprocess.Popen(
+            command, env=env, preexec_fn=lambda: signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        )
+        self.children[index] = (process, time.monotonic())
+
+    def _run_worker(self, index: int) -> None:
+        options = self.options
+        if options["pin"]:
+            os.sched_setaffinity(0, {self.cpus[index % len(self.cpus)]})
+
+        sock = _reuseport_socket(options["host"], options["port"], options["backlog"])
+        # Twisted adopts (and closes) the descriptor; Python must not close it too.
+        fileno = sock.detach()
+
+        from channels.routing import get_default_application
+        from daphne.server import Server
+        from twisted.internet import task
+
+        path = os.path.join(options["metrics_dir"], f"worker-{index}.json")
+        task.LoopingCall(
+            metrics.write_snapshot, path, worker=index, pid=os.getpid()
+        ).start(options["metrics_interval"])
+
+        Server(
+            application=get_default_application(),
+            endpoints=[f"fd:fileno={fileno}"],
+            signal_handlers=True,
+            verbosity=options["verbosity"],
+        ).run()
+
+    def _reap(self) -> None:
+        for index, (process, started) in list(self.children.items()):
+            status = process.poll()
+            if status is None:
+                continue
+            del self.children[index]
+            if self.stopping:
+                continue
+            self.stderr.write(
+                f"Worker {index} (pid {process.pid}) exited with status {status}; restarting"
+            )
+            # Don't spin if a worker dies straight after starting.
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            self._spawn(index)
+
+    def _aggregate(self, count: int) -> None:
+        stale_after = 3 * self.options["metrics_interval"]
+        now = time.time()
+        workers = {}
+        snapshots = []
+        for index in range(count):
+            path = os.path.join(self.options["metrics_dir"], f"worker-{index}.json")
+            try:
+                with open(path) as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                workers[index] = {"healthy": False}
+                continue
+            snapshots.append(data)
+            workers[index] = {
+                "pid": data.get("pid"),
+                "healthy": now - data["written_at"] <= stale_after,
+                "age_s": round(now - data["written_at"], 1),
+            }
+
+        report = {
+            "written_at": now,
+            "workers": workers,
+            "healthy": sum(worker["healthy"] for worker in workers.values()),
+            "counters": metrics.merge_snapshots(snapshots),
+        }
+        path = os.path.join(self.options["metrics_dir"], "aggregate.json")
+        with open(f"{path}.tmp", "w") as fh:
+            json.dump(report, fh)
+        os.replace(f"{path}.tmp", path)
+
+    def _stop(self, signum, frame) -> None:
+        self.stopping = True
+        self._forward(signal.SIGTERM, frame)
+
+    def _forward(self, signum, frame) -> None:
+        for process, _started in list(self.children.values()):
+            if process.poll() is None:
+                process.send_signal(signum)
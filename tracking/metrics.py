@@ -0,0 +1,96 @@
+"""
+Process-local counters for the tracking pipeline.
+
+Counters are plain in-memory integers: cheap enough to bump on every fix
+and read with ``snapshot()`` for logging or a metrics endpoint. ``timed()``
+records how long a stage took; the last ``TIMING_SAMPLES`` durations per
+stage are kept and summarised by ``timings()``. Workers
+started by ``manage.py runworkers`` also dump them to a JSON file with
+``write_snapshot()``, and the parent sums those with ``merge_snapshots()``.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+TIMING_SAMPLES = 10_000
+
+_counters: Counter = Counter()
+_timings: defaultdict = defaultdict(lambda: deque(maxlen=TIMING_SAMPLES))
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name: str) -> int:
+    return _counters.get(name, 0)
+
+
+def snapshot() -> dict[str, int]:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def observe(name: str, seconds: float) -> None:
+    with _lock:
+        _timings[name].append(seconds)
+
+
+class timed:
+    """Context manager that ``observe()``s how long its block took."""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started)
+
+
+def timings() -> dict[str, dict[str, float]]:
+    """Count, p50, p99 and max (milliseconds) of the kept samples per stage."""
+    with _lock:
+        samples = {name: sorted(values) for name, values in _timings.items()}
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": statistics.median(values) * 1000,
+            "p99_ms": values[max(int(len(values) * 0.99) - 1, 0)] * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+        for name, values in samples.items()
+        if values
+    }
+
+
+def write_snapshot(path, **extra) -> None:
+    """Atomically write the counters, a timestamp and ``extra`` to ``path``."""
+    data = {"counters": snapshot(), "written_at": time.time(), **extra}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+def merge_snapshots(snapshots) -> dict[str, int]:
+    """Sum the ``counters`` of several ``write_snapshot()`` payloads."""
+    total: Counter = Counter()
+    for data in snapshots:
+        total.update(data.get("counters", {}))
+    return dict(total)
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def mark_latest_rides_in_progress(apps, schema_editor):
+    # Before statuses existed the newest ride per driver was treated as the
+    # live one; keep it that way and consider everything older finished.
+    Ride = apps.get_model("tracking", "Ride")
+    latest = (
+        Ride.objects.filter(driver=OuterRef("driver"))
+        .order_by("-created_at", "-id")
+        .values("id")[:1]
+    )
+    Ride.objects.filter(id=Subquery(latest)).update(status="in_progress")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='status',
+            field=models.CharField(choices=[('requested', 'Requested'), ('accepted', 'Accepted'), ('in_progress', 'In progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='completed', max_length=16),
+            preserve_default=False,
+        ),
+        migrations.RunPython(mark_latest_rides_in_progress, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ride',
+            name='status',
+            field=models.CharField(choices=[('requested', 'Requested'), ('accepted', 'Accepted'), ('in_progress', 'In progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='requested', max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='ride',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['requested', 'accepted', 'in_progress'])), fields=('driver',), name='tracking_ride_one_active_per_driver'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+import tracking.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0002_ride_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverlocation',
+            name='latitude_e6',
+            field=tracking.fields.MicrodegreeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='driverlocation',
+            name='longitude_e6',
+            field=tracking.fields.MicrodegreeField(null=True),
+        ),
+        # Nullable before removal, so unapplying re-adds the decimal columns
+        # empty, fills them from the microdegrees and only then restores NOT NULL.
+        migrations.AlterField(
+            model_name='driverlocation',
+            name='latitude',
+            field=models.DecimalField(decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AlterField(
+            model_name='driverlocation',
+            name='longitude',
+            field=models.DecimalField(decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                "UPDATE tracking_driverlocation "
+                "SET latitude_e6 = ROUND(latitude * 1000000), "
+                "longitude_e6 = ROUND(longitude * 1000000)"
+            ),
+            reverse_sql=(
+                "UPDATE tracking_driverlocation "
+                "SET latitude = latitude_e6 / 1000000.0, "
+                "longitude = longitude_e6 / 1000000.0"
+            ),
+        ),
+        migrations.RemoveField(
+            model_name='driverlocation',
+            name='latitude',
+        ),
+        migrations.RemoveField(
+            model_name='driverlocation',
+            name='longitude',
+        ),
+        migrations.RenameField(
+            model_name='driverlocation',
+            old_name='latitude_e6',
+            new_name='latitude',
+        ),
+        migrations.RenameField(
+            model_name='driverlocation',
+            old_name='longitude_e6',
+            new_name='longitude',
+        ),
+        migrations.AlterField(
+            model_name='driverlocation',
+            name='latitude',
+            field=tracking.fields.MicrodegreeField(),
+        ),
+        migrations.AlterField(
+            model_name='driverlocation',
+            name='longitude',
+            field=tracking.fields.MicrodegreeField(),
+        ),
+    ]
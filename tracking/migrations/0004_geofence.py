@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:10
+
+import tracking.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0003_driverlocation_microdegrees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Geofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('circle', 'Circle'), ('polygon', 'Polygon')], max_length=16)),
+                ('center_latitude', tracking.fields.MicrodegreeField(blank=True, null=True)),
+                ('center_longitude', tracking.fields.MicrodegreeField(blank=True, null=True)),
+                ('radius_m', models.FloatField(blank=True, null=True)),
+                ('vertices', models.JSONField(blank=True, default=list)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
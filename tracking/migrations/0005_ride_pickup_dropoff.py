@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:45
+
+import tracking.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0004_geofence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_latitude',
+            field=tracking.fields.MicrodegreeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_longitude',
+            field=tracking.fields.MicrodegreeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_latitude',
+            field=tracking.fields.MicrodegreeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_longitude',
+            field=tracking.fields.MicrodegreeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,12 @@
+import math
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
+from .fields import MicrodegreeField
+
 
 class Driver(models.Model):
     user = models.OneToOneField(
@@ -21,15 +26,47 @@ class DriverLocation(models.Model):
         on_delete=models.CASCADE,
         related_name="location",
     )
-    latitude = models.DecimalField(max_digits=9, decimal_places=6)
-    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    latitude = MicrodegreeField()
+    longitude = MicrodegreeField()
     updated_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self) -> str:
         return f"{self.driver} @ {self.latitude},{self.longitude}"
 
 
+class RideQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__in=Ride.ACTIVE_STATUSES)
+
+    def active_for_driver(self, driver):
+        """
+        The driver's current ride, if any. Served by the partial unique index
+        on (driver) for active statuses, so it is a single index probe.
+        """
+        return self.active().filter(driver=driver).first()
+
+
+class RideStatus(models.TextChoices):
+    REQUESTED = "requested", "Requested"
+    ACCEPTED = "accepted", "Accepted"
+    IN_PROGRESS = "in_progress", "In progress"
+    COMPLETED = "completed", "Completed"
+    CANCELLED = "cancelled", "Cancelled"
+
+
+# At module level so Ride.Meta, which can't see Ride's namespace, can use it.
+ACTIVE_RIDE_STATUSES = (RideStatus.REQUESTED, RideStatus.ACCEPTED, RideStatus.IN_PROGRESS)
+
+
 class Ride(models.Model):
+    Status = RideStatus
+    ACTIVE_STATUSES = ACTIVE_RIDE_STATUSES
+    TRANSITIONS = {
+        Status.REQUESTED: (Status.ACCEPTED, Status.CANCELLED),
+        Status.ACCEPTED: (Status.IN_PROGRESS, Status.CANCELLED),
+        Status.IN_PROGRESS: (Status.COMPLETED, Status.CANCELLED),
+    }
+
     ride_id = models.CharField(max_length=64, unique=True)
     driver = models.ForeignKey(
         Driver,
@@ -41,7 +78,116 @@ class Ride(models.Model):
         on_delete=models.CASCADE,
         related_name="rides",
     )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.REQUESTED,
+    )
+    pickup_latitude = MicrodegreeField(null=True, blank=True)
+    pickup_longitude = MicrodegreeField(null=True, blank=True)
+    dropoff_latitude = MicrodegreeField(null=True, blank=True)
+    dropoff_longitude = MicrodegreeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = RideQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["driver"],
+                condition=models.Q(status__in=[status.value for status in ACTIVE_RIDE_STATUSES]),
+                name="tracking_ride_one_active_per_driver",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Ride {self.ride_id}"
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in self.ACTIVE_STATUSES
+
+    def can_transition_to(self, status: str) -> bool:
+        return status in self.TRANSITIONS.get(self.status, ())
+
+    @property
+    def target(self):
+        """
+        Where the driver is heading: the pickup until the ride starts, then
+        the drop-off. ``None`` if that point isn't known.
+        """
+        if self.status == self.Status.IN_PROGRESS:
+            point = (self.dropoff_latitude, self.dropoff_longitude)
+        else:
+            point = (self.pickup_latitude, self.pickup_longitude)
+        return None if None in point else point
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_coordinate(latitude, longitude) -> bool:
+    return (
+        _is_number(latitude)
+        and _is_number(longitude)
+        and -90 <= latitude <= 90
+        and -180 <= longitude <= 180
+    )
+
+
+class Geofence(models.Model):
+    """
+    A circular or polygonal zone (pickup zone, airport queue, ...). Drivers
+    entering or leaving it generate events; see tracking.geofence.
+    """
+
+    class Kind(models.TextChoices):
+        CIRCLE = "circle", "Circle"
+        POLYGON = "polygon", "Polygon"
+
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    # Circle fences
+    center_latitude = MicrodegreeField(null=True, blank=True)
+    center_longitude = MicrodegreeField(null=True, blank=True)
+    radius_m = models.FloatField(null=True, blank=True)
+    # Polygon fences: [[lat, lon], ...]
+    vertices = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Geofence {self.name}"
+
+    def clean(self):
+        from .geofence import fence_from_row, max_span_degrees
+
+        if self.kind == self.Kind.CIRCLE:
+            if not (
+                _is_coordinate(self.center_latitude, self.center_longitude)
+                and _is_number(self.radius_m)
+                and self.radius_m > 0
+            ):
+                raise ValidationError("Circle fences need a center and a positive radius.")
+        elif self.kind == self.Kind.POLYGON:
+            if (
+                not isinstance(self.vertices, list)
+                or len(self.vertices) < 3
+                or not all(
+                    isinstance(vertex, (list, tuple))
+                    and len(vertex) == 2
+                    and _is_coordinate(*vertex)
+                    for vertex in self.vertices
+                )
+            ):
+                raise ValidationError(
+                    "Polygon fences need at least three [lat, lon] vertices in range."
+                )
+        else:
+            return
+
+        min_lat, min_lon, max_lat, max_lon = fence_from_row(self).bbox
+        span = max_span_degrees()
+        if max_lat - min_lat > span or max_lon - min_lon > span:
+            raise ValidationError(f"Fences may span at most {span} degrees.")
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key, newest first.
+
+    Each page is ``WHERE id < <cursor> ORDER BY id DESC LIMIT n``, so deep
+    pages cost the same as the first one (no OFFSET scan).
+    """
+
+    ordering = "-id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
@@ -0,0 +1,122 @@
+"""
+Server-side trip progress: distance travelled, smoothed speed and heading,
+and straight-line distance/ETA to the ride's current target.
+
+``RideProgress`` is fed one fix at a time by the driver's socket and does a
+constant amount of work per fix. ``estimate_rides()`` recomputes the
+distance/ETA part for many rides at once for the REST endpoints, which have
+no running state and fall back to ``TRACKING_ETA_DEFAULT_SPEED_KMH``.
+"""
+import math
+
+from django.conf import settings
+
+from .geo import haversine_m, initial_bearing_deg
+
+# Below this speed (m/s) the driver is treated as stopped and the ETA uses the
+# configured default speed instead of dividing by ~0.
+MIN_MOVING_SPEED_MPS = 1.0
+# Ignore heading changes from moves shorter than this; GPS noise dominates.
+MIN_HEADING_DISTANCE_M = 5.0
+
+
+def default_speed_mps() -> float:
+    return float(getattr(settings, "TRACKING_ETA_DEFAULT_SPEED_KMH", 25)) / 3.6
+
+
+def _eta_seconds(distance_m, speed_mps):
+    if distance_m is None:
+        return None
+    if speed_mps is None or speed_mps < MIN_MOVING_SPEED_MPS:
+        speed_mps = default_speed_mps()
+    return round(distance_m / speed_mps)
+
+
+class RideProgress:
+    __slots__ = (
+        "smoothing",
+        "last_fix",
+        "distance_m",
+        "speed_mps",
+        "_heading_x",
+        "_heading_y",
+    )
+
+    def __init__(self, smoothing: float | None = None):
+        # Weight of the newest sample in the exponential moving averages.
+        self.smoothing = (
+            smoothing
+            if smoothing is not None
+            else float(getattr(settings, "TRACKING_PROGRESS_SMOOTHING", 0.3))
+        )
+        self.last_fix = None
+        self.distance_m = 0.0
+        self.speed_mps = None
+        # Heading is averaged as a unit vector so 359 deg and 1 deg average to 0.
+        self._heading_x = None
+        self._heading_y = None
+
+    @property
+    def heading_deg(self):
+        if self._heading_x is None:
+            return None
+        return math.degrees(math.atan2(self._heading_x, self._heading_y)) % 360
+
+    def update(self, latitude: float, longitude: float, at: float, target=None) -> dict:
+        """
+        Fold in a fix taken at ``at`` (epoch seconds) and return the progress
+        fields to attach to the broadcast.
+        """
+        if self.last_fix is not None:
+            last_lat, last_lon, last_at = self.last_fix
+            step_m = haversine_m(last_lat, last_lon, latitude, longitude)
+            elapsed = at - last_at
+            self.distance_m += step_m
+
+            if elapsed > 0:
+                speed = step_m / elapsed
+                self.speed_mps = (
+                    speed
+                    if self.speed_mps is None
+                    else self.smoothing * speed + (1 - self.smoothing) * self.speed_mps
+                )
+
+            if step_m >= MIN_HEADING_DISTANCE_M:
+                bearing = math.radians(initial_bearing_deg(last_lat, last_lon, latitude, longitude))
+                x, y = math.sin(bearing), math.cos(bearing)
+                if self._heading_x is None:
+                    self._heading_x, self._heading_y = x, y
+                else:
+                    self._heading_x = self.smoothing * x + (1 - self.smoothing) * self._heading_x
+                    self._heading_y = self.smoothing * y + (1 - self.smoothing) * self._heading_y
+
+        self.last_fix = (latitude, longitude, at)
+
+        remaining_m = haversine_m(latitude, longitude, *target) if target else None
+        heading = self.heading_deg
+        return {
+            "distance_travelled_m": round(self.distance_m, 1),
+            "speed_mps": round(self.speed_mps, 2) if self.speed_mps is not None else None,
+            "heading_deg": round(heading, 1) if heading is not None else None,
+            "distance_remaining_m": round(remaining_m, 1) if remaining_m is not None else None,
+            "eta_seconds": _eta_seconds(remaining_m, self.speed_mps),
+        }
+
+
+def estimate_rides(rides) -> dict:
+    """
+    Distance remaining and ETA for each ride from its driver's last known
+    location, keyed by ride_id. Expects ``select_related("driver__location")``.
+    """
+    estimates = {}
+    for ride in rides:
+        location = getattr(ride.driver, "location", None)
+        target = ride.target
+        remaining_m = None
+        if location is not None and target is not None:
+            remaining_m = haversine_m(location.latitude, location.longitude, *target)
+        estimates[ride.ride_id] = {
+            "distance_remaining_m": round(remaining_m, 1) if remaining_m is not None else None,
+            "eta_seconds": _eta_seconds(remaining_m, None),
+        }
+    return estimates
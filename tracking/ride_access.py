@@ -0,0 +1,65 @@
+"""
+Which rides a user may subscribe to on the WebSocket.
+
+A user may follow the rides they are the rider or the driver of; staff may
+follow any ride. The active rides of a user are looked up once and kept in
+the shared cache as ``{ride_id: driver_id}``, so a reconnecting rider is
+authorised with one cache hit instead of a query. Creating a ride or
+changing its status evicts the entries of its rider and driver (see
+tracking.signals, ``RideStatusView`` and ``RideBatchCreateView``), and consumers that miss in their own copy re-read
+the cache before refusing. A load that raced the eviction can still write
+back a copy without the new ride, so a ride missing from the cached copy
+is checked in the DB before it is refused.
+"""
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+ACCESS_CACHE_KEY = "tracking_ride_access:%s"
+ACCESS_CACHE_TIMEOUT = 60 * 60
+
+
+def load_permitted_rides(user_id) -> dict:
+    from .models import Ride
+
+    return dict(
+        Ride.objects.active()
+        .filter(Q(rider_id=user_id) | Q(driver__user_id=user_id))
+        .values_list("ride_id", "driver_id")
+    )
+
+
+def is_permitted(user_id, ride_id) -> bool:
+    from .models import Ride
+
+    return (
+        Ride.objects.active()
+        .filter(Q(rider_id=user_id) | Q(driver__user_id=user_id), ride_id=ride_id)
+        .exists()
+    )
+
+
+async def permitted_rides(user_id, ride_id=None) -> dict:
+    """
+    ``{ride_id: driver_id}`` of the active rides ``user_id`` may follow.
+
+    If ``ride_id`` is given and missing from the cached copy but permitted
+    in the DB, the copy is stale and gets reloaded.
+    """
+    key = ACCESS_CACHE_KEY % user_id
+    rides = await cache.aget(key)
+    if rides is None or (
+        ride_id is not None
+        and ride_id not in rides
+        and await database_sync_to_async(is_permitted)(user_id, ride_id)
+    ):
+        rides = await database_sync_to_async(load_permitted_rides)(user_id)
+        await cache.aset(key, rides, ACCESS_CACHE_TIMEOUT)
+    return rides
+
+
+def forget_users(user_ids) -> None:
+    """Evict the cached rides of ``user_ids`` once the current transaction commits."""
+    keys = [ACCESS_CACHE_KEY % user_id for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
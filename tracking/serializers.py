@@ -1,6 +1,9 @@
+import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
-from .models import Driver, DriverLocation, Ride
+from .models import Driver, DriverLocation, Geofence, Ride
 
 
 class DriverSerializer(serializers.ModelSerializer):
@@ -10,17 +13,98 @@ class DriverSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "user")
 
 
+class RidePointsSerializer(serializers.Serializer):
+    """
+    Optional pickup/drop-off coordinates accepted when creating rides.
+    """
+
+    pickup_latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    pickup_longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    dropoff_latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    dropoff_longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+
+
+class RideBatchItemSerializer(RidePointsSerializer):
+    """
+    One entry of a ride batch; a ``ride_id`` is generated when it's left out.
+    """
+
+    driver_id = serializers.IntegerField()
+    ride_id = serializers.CharField(max_length=64, required=False, allow_blank=True)
+
+
+class RideIdsSerializer(serializers.Serializer):
+    """
+    Ride ids passed as a comma-separated ``ids`` query parameter.
+    """
+
+    ids = serializers.ListField(child=serializers.CharField(max_length=64))
+
+
 class RideSerializer(serializers.ModelSerializer):
+    pickup_latitude = serializers.FloatField(read_only=True)
+    pickup_longitude = serializers.FloatField(read_only=True)
+    dropoff_latitude = serializers.FloatField(read_only=True)
+    dropoff_longitude = serializers.FloatField(read_only=True)
+
     class Meta:
         model = Ride
-        fields = ("ride_id", "driver", "rider", "created_at")
-        read_only_fields = ("ride_id", "rider", "created_at")
+        fields = (
+            "ride_id",
+            "driver",
+            "rider",
+            "status",
+            "pickup_latitude",
+            "pickup_longitude",
+            "dropoff_latitude",
+            "dropoff_longitude",
+            "created_at",
+        )
+        read_only_fields = ("ride_id", "rider", "status", "created_at")
 
 
 class DriverLocationSerializer(serializers.ModelSerializer):
+    # Stored as integer microdegrees (see tracking.fields); exposed as floats.
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
     class Meta:
         model = DriverLocation
         fields = ("driver", "latitude", "longitude", "updated_at")
         read_only_fields = ("driver", "updated_at")
 
 
+class GeofenceSerializer(serializers.ModelSerializer):
+    center_latitude = serializers.FloatField(
+        min_value=-90, max_value=90, required=False, allow_null=True
+    )
+    center_longitude = serializers.FloatField(
+        min_value=-180, max_value=180, required=False, allow_null=True
+    )
+
+    class Meta:
+        model = Geofence
+        fields = (
+            "id",
+            "name",
+            "kind",
+            "center_latitude",
+            "center_longitude",
+            "radius_m",
+            "vertices",
+            "is_active",
+            "updated_at",
+        )
+        read_only_fields = ("id", "updated_at")
+
+    def validate(self, attrs):
+        # On updates (partial ones especially) validate the fence as it will
+        # be saved: the submitted fields over the stored ones.
+        fence = copy.copy(self.instance) if self.instance is not None else Geofence()
+        for name, value in attrs.items():
+            setattr(fence, name, value)
+        try:
+            fence.clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return attrs
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import geofence, ride_access
+from .models import Geofence, Ride
+
+
+@receiver(post_save, sender=Geofence)
+@receiver(post_delete, sender=Geofence)
+def refresh_geofences(sender, **kwargs):
+    # Reload locally right away; other workers pick up the version bump.
+    geofence.bump_version()
+    geofence.registry.clear()
+
+
+@receiver(post_save, sender=Ride)
+def refresh_ride_access(sender, instance, created, update_fields=None, **kwargs):
+    # New rides and status changes alter which active rides a user may follow.
+    # Entries for deleted rides are harmless and age out with the cache timeout.
+    if created or update_fields is None or "status" in update_fields:
+        ride_access.forget_users([instance.rider_id, instance.driver.user_id])
@@ -1,3 +1,942 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import signal
+import tempfile
+import time
+from collections import deque
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authapp.models import User
+
+from .geofence import Fence, GeofenceIndex, GeofenceRegistry, load_index
+from . import drain, geofence, metrics, ride_access, trace
+from .consumers import TrackingConsumer
+from .fixes import Fix, FixPipeline, KalmanSmoother, build_filters
+from .models import Driver, DriverLocation, Geofence, Ride
+from .progress import RideProgress
+from .routing import websocket_urlpatterns
+from .serializers import GeofenceSerializer
+
+
+class TrackingAPITestCase(TestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user("+919999900001")
+        self.driver_user = User.objects.create_user("+919999900002")
+        self.driver = Driver.objects.create(user=self.driver_user)
+
+    def client_for(self, user) -> APIClient:
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    async def connect_socket(self, user) -> WebsocketCommunicator:
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f"/ws/tracking/?token={AccessToken.for_user(user)}",
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+
+class RideLifecycleTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ride = Ride.objects.create(ride_id="RIDE-1", driver=self.driver, rider=self.rider)
+
+    def _set_status(self, user, status: str):
+        return self.client_for(user).post(
+            reverse("ride-status", args=[self.ride.ride_id]), {"status": status}
+        )
+
+    def test_driver_walks_ride_through_lifecycle(self):
+        for status in ("accepted", "in_progress", "completed"):
+            response = self._set_status(self.driver_user, status)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["status"], status)
+
+        self.assertIsNone(Ride.objects.active_for_driver(self.driver))
+
+    def test_invalid_transition_and_rider_permissions(self):
+        self.assertEqual(self._set_status(self.driver_user, "completed").status_code, 409)
+        self.assertEqual(self._set_status(self.rider, "accepted").status_code, 403)
+        self.assertEqual(self._set_status(self.rider, "cancelled").status_code, 200)
+
+    def test_one_active_ride_per_driver(self):
+        response = self.client_for(self.rider).post(
+            reverse("ride-create"), {"driver_id": self.driver.id, "ride_id": "RIDE-2"}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["detail"], "Driver already has an active ride.")
+
+        self._set_status(self.rider, "cancelled")
+        response = self.client_for(self.rider).post(
+            reverse("ride-create"), {"driver_id": self.driver.id, "ride_id": "RIDE-2"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ride.objects.active_for_driver(self.driver).ride_id, "RIDE-2")
+
+    def test_other_integrity_errors_are_not_reported_as_active_rides(self):
+        self._set_status(self.rider, "cancelled")
+        with mock.patch.object(
+            Ride.objects, "get_or_create", side_effect=IntegrityError("fk")
+        ), self.assertRaises(IntegrityError):
+            self.client_for(self.rider).post(reverse("ride-create"), {"driver_id": self.driver.id})
+
+
+class DriverLocationStorageTests(TrackingAPITestCase):
+    def test_coordinates_round_trip_as_floats(self):
+        DriverLocation.objects.create(driver=self.driver, latitude=12.9715987, longitude=-77.594566)
+        Ride.objects.create(ride_id="RIDE-1", driver=self.driver, rider=self.rider)
+
+        location = DriverLocation.objects.get(driver=self.driver)
+        self.assertEqual(location.latitude, 12.971599)
+        self.assertTrue(DriverLocation.objects.filter(longitude__lt=-77.5).exists())
+
+        response = self.client_for(self.rider).get(reverse("ride-location", args=["RIDE-1"]))
+        self.assertEqual(response.data["latitude"], 12.971599)
+        self.assertEqual(response.data["longitude"], -77.594566)
+
+
+class RideBatchTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.drivers = [self.driver] + [
+            Driver.objects.create(user=User.objects.create_user(f"+91999990010{i}"))
+            for i in range(3)
+        ]
+
+    def test_batch_create_reports_created_existing_and_rejected(self):
+        Ride.objects.create(ride_id="RIDE-0", driver=self.drivers[0], rider=self.rider)
+        payload = {
+            "rides": [
+                {"driver_id": self.drivers[0].id, "ride_id": "RIDE-0"},
+                {"driver_id": self.drivers[1].id, "ride_id": "RIDE-1"},
+                {"driver_id": self.drivers[2].id, "ride_id": "RIDE-2"},
+                {"driver_id": self.drivers[2].id, "ride_id": "RIDE-3"},
+            ]
+        }
+
+        response = self.client_for(self.rider).post(
+            reverse("ride-batch-create"), payload, format="json"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r["ride_id"] for r in response.data["created"]], ["RIDE-1", "RIDE-2"])
+        self.assertEqual([r["ride_id"] for r in response.data["existing"]], ["RIDE-0"])
+        self.assertEqual([r["ride_id"] for r in response.data["rejected"]], ["RIDE-3"])
+
+    def test_batch_create_unknown_driver_creates_nothing(self):
+        response = self.client_for(self.rider).post(
+            reverse("ride-batch-create"),
+            {"rides": [{"driver_id": self.driver.id}, {"driver_id": 999999}]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Ride.objects.exists())
+
+    def test_malformed_ride_ids_are_refused(self):
+        client = self.client_for(self.rider)
+
+        response = client.post(
+            reverse("ride-batch-create"),
+            {"rides": [{"driver_id": self.drivers[1].id, "ride_id": "R" * 65}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Ride.objects.exists())
+
+        response = client.post(
+            reverse("ride-batch-create"),
+            {"rides": [{"driver_id": self.drivers[1].id, "ride_id": 5}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r["ride_id"] for r in response.data["created"]], ["5"])
+
+        for name in ("ride-create", "ride-eta"):
+            response = client.get(reverse(name), {"ids": "RIDE-0," + "R" * 65})
+            self.assertEqual(response.status_code, 400, name)
+
+    def test_bulk_lookup_is_one_query(self):
+        for i, driver in enumerate(self.drivers):
+            Ride.objects.create(ride_id=f"RIDE-{i}", driver=driver, rider=self.rider)
+        client = self.client_for(self.rider)
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse("ride-create"), {"ids": "RIDE-0,RIDE-3,NOPE"})
+
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(response.data["missing"], ["NOPE"])
+
+    def test_lookups_only_show_own_rides(self):
+        Ride.objects.create(ride_id="RIDE-0", driver=self.drivers[1], rider=self.rider)
+        stranger = self.client_for(User.objects.create_user("+919999900099"))
+
+        response = stranger.get(reverse("ride-create"), {"ids": "RIDE-0"})
+        self.assertEqual(response.data, {"results": [], "missing": ["RIDE-0"]})
+        response = stranger.get(reverse("ride-eta"), {"ids": "RIDE-0"})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client_for(self.drivers[1].user).get(reverse("ride-eta"), {"ids": "RIDE-0"})
+        self.assertEqual(list(response.data), ["RIDE-0"])
+
+
+class QueryCountTests(TrackingAPITestCase):
+    """
+    Page and endpoint query counts must not grow with the number of rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("+919999900000")
+        self._add_rides(3)
+
+    def _add_rides(self, count: int):
+        start = Ride.objects.count()
+        for i in range(start, start + count):
+            driver = Driver.objects.create(user=User.objects.create_user(f"+9188888{i:05d}"))
+            DriverLocation.objects.create(driver=driver, latitude=12.9, longitude=77.6)
+            Ride.objects.create(ride_id=f"RIDE-Q{i}", driver=driver, rider=self.rider)
+
+    def _count_queries(self, url: str) -> int:
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_admin_changelists_are_constant(self):
+        urls = [
+            reverse("admin:tracking_driver_changelist"),
+            reverse("admin:tracking_driverlocation_changelist"),
+            reverse("admin:tracking_ride_changelist"),
+        ]
+        before = [self._count_queries(url) for url in urls]
+        self._add_rides(10)
+        after = [self._count_queries(url) for url in urls]
+
+        self.assertEqual(before, after)
+
+    def test_ride_location_is_one_query(self):
+        client = self.client_for(self.rider)
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse("ride-location", args=["RIDE-Q0"]))
+
+        self.assertEqual(response.status_code, 200)
+
+
+class RideListingAndExportTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("+919999900000")
+        other_rider = User.objects.create_user("+919999900003")
+        for i in range(5):
+            driver = Driver.objects.create(user=User.objects.create_user(f"+9177777{i:05d}"))
+            DriverLocation.objects.create(driver=driver, latitude=12.9 + i / 100, longitude=77.6)
+            rider = self.rider if i % 2 == 0 else other_rider
+            Ride.objects.create(ride_id=f"RIDE-L{i}", driver=driver, rider=rider)
+
+    def test_cursor_pages_only_show_own_rides(self):
+        client = self.client_for(self.rider)
+
+        first = client.get(reverse("ride-create"), {"page_size": 2})
+        second = client.get(first.data["next"])
+
+        ride_ids = [r["ride_id"] for r in first.data["results"] + second.data["results"]]
+        self.assertEqual(ride_ids, ["RIDE-L4", "RIDE-L2", "RIDE-L0"])
+        self.assertIsNone(second.data["next"])
+
+    async def test_export_streams_ndjson_and_csv(self):
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.admin)}"}
+
+        async def fetch(name, params):
+            response = await self.async_client.get(reverse(name), params, headers=headers)
+            self.assertTrue(response.is_async)
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        content = await fetch("ride-export", {"rider": self.rider.id})
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["ride_id"] for row in rows], ["RIDE-L0", "RIDE-L2", "RIDE-L4"])
+
+        lines = (await fetch("location-export", {"output": "csv"})).decode().splitlines()
+        self.assertEqual(lines[0], "driver_id,latitude,longitude,updated_at")
+        self.assertEqual(len(lines), 6)
+
+    def test_impossible_datetimes_are_refused(self):
+        client = self.client_for(self.rider)
+        for value in ("yesterday", "2024-02-30T00:00:00"):
+            response = client.get(reverse("ride-create"), {"since": value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn("since", response.data)
+
+    def test_export_requires_staff(self):
+        response = self.client_for(self.rider).get(reverse("location-export"))
+        self.assertEqual(response.status_code, 403)
+
+
+class GeofenceTests(TrackingAPITestCase):
+    def test_index_matches_circles_and_polygons(self):
+        index = GeofenceIndex(
+            [
+                Fence(1, "airport", "circle", center=(13.1986, 77.7066), radius_m=500),
+                Fence(2, "mall", "polygon", vertices=[(12.97, 77.59), (12.98, 77.59), (12.98, 77.60)]),
+            ]
+        )
+
+        self.assertEqual(index.containing(13.1990, 77.7070), {1})
+        self.assertEqual(index.containing(12.979, 77.591), {2})
+        self.assertEqual(index.containing(12.971, 77.599), frozenset())
+
+    def test_invalid_fences_are_refused_and_skipped(self):
+        client = self.client_for(User.objects.create_user("+919999900010", is_staff=True))
+        for body in [
+            {"kind": "polygon", "vertices": [1, 2, 3]},
+            {"kind": "polygon", "vertices": [[12.97, 77.59], [12.98, "x"], [12.98, 77.60]]},
+            {"kind": "polygon", "vertices": [[12.97, 77.59], [95, 77.59], [12.98, 77.60]]},
+            {"kind": "polygon", "vertices": [[10, 70], [20, 70], [20, 80]]},
+            {"kind": "circle", "center_latitude": 12.9, "center_longitude": 77.6, "radius_m": 1e9},
+        ]:
+            response = client.post(reverse("geofence-list"), {"name": "bad", **body}, format="json")
+            self.assertEqual(response.status_code, 400, body)
+
+        Geofence.objects.create(name="stored", kind="polygon", vertices=[[1, 2], "x", None])
+        good = Geofence.objects.create(
+            name="ok", kind="circle", center_latitude=12.9, center_longitude=77.6, radius_m=100
+        )
+        self.assertEqual(list(load_index().fences), [good.id])
+
+    def test_updates_are_validated_against_the_stored_fence(self):
+        fence = Geofence.objects.create(
+            name="ok", kind="circle", center_latitude=12.9, center_longitude=77.6, radius_m=100
+        )
+        serializer = GeofenceSerializer(fence, data={"radius_m": 1e9}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        serializer = GeofenceSerializer(fence, data={"name": "renamed"}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        fence.refresh_from_db()
+        self.assertEqual((fence.name, fence.radius_m), ("renamed", 100))
+
+    async def test_registry_loads_once_and_survives_failed_reloads(self):
+        registry = GeofenceRegistry()
+        index = GeofenceIndex(version=0)
+        with mock.patch.object(geofence, "load_index", return_value=index) as load:
+            indexes = await asyncio.gather(*(registry.get_index() for _ in range(5)))
+        self.assertEqual(load.call_count, 1)
+        self.assertTrue(all(result is index for result in indexes))
+
+        await cache.aset(geofence.VERSION_CACHE_KEY, 1)
+        registry._checked_at = 0
+        with self.assertLogs("tracking.geofence", "ERROR"), mock.patch.object(
+            geofence, "load_index", side_effect=RuntimeError("db down")
+        ):
+            self.assertIs(await registry.get_index(), index)
+            await registry._refreshing
+        self.assertIs(await registry.get_index(), index)
+
+        registry.clear()
+        with self.assertLogs("tracking.geofence", "ERROR"), mock.patch.object(
+            geofence, "load_index", side_effect=RuntimeError("db down")
+        ):
+            self.assertEqual((await registry.get_index()).fences, {})
+
+    async def test_driver_crossing_fence_emits_enter_and_exit(self):
+        fence = await Geofence.objects.acreate(
+            name="pickup", kind="circle", center_latitude=12.97, center_longitude=77.59, radius_m=200
+        )
+        self.rider.is_staff = True
+        await self.rider.asave()
+
+        watcher = await self.connect_socket(self.rider)
+        await watcher.send_json_to({"event": "subscribe_geofence", "fence_id": fence.id})
+        await watcher.receive_json_from()
+
+        driver = await self.connect_socket(self.driver_user)
+        await driver.send_json_to({"event": "driver_identify", "driver_id": self.driver.id})
+        await driver.receive_json_from()
+        await driver.receive_json_from()  # cadence
+
+        start = timezone.now() - timedelta(hours=1)
+        for minute, latitude in enumerate((12.90, 12.9701, 12.90)):
+            await driver.send_json_to(
+                {
+                    "event": "driver_location",
+                    "latitude": latitude,
+                    "longitude": 77.59,
+                    "timestamp": (start + timedelta(minutes=5 * minute)).isoformat(),
+                }
+            )
+            self.assertEqual((await driver.receive_json_from())["status"], "location_updated")
+
+        events = [(await watcher.receive_json_from())["event"] for _ in range(2)]
+        self.assertEqual(events, ["geofence_enter", "geofence_exit"])
+
+        await watcher.disconnect()
+        await driver.disconnect()
+
+
+class RideProgressTests(TrackingAPITestCase):
+    def test_running_state_accumulates_per_fix(self):
+        progress = RideProgress(smoothing=1.0)
+        target = (12.99, 77.59)
+
+        progress.update(12.97, 77.59, at=0, target=target)
+        result = progress.update(12.971, 77.59, at=10, target=target)
+
+        self.assertAlmostEqual(result["distance_travelled_m"], 111.2, delta=0.5)
+        self.assertAlmostEqual(result["speed_mps"], 11.12, delta=0.05)
+        self.assertAlmostEqual(result["heading_deg"], 0.0, delta=0.1)
+        self.assertAlmostEqual(result["distance_remaining_m"], 2112.7, delta=1)
+        self.assertEqual(result["eta_seconds"], round(result["distance_remaining_m"] / (111.19 / 10)))
+
+    def test_eta_endpoint_uses_pickup_then_dropoff(self):
+        DriverLocation.objects.create(driver=self.driver, latitude=12.97, longitude=77.59)
+        response = self.client_for(self.rider).post(
+            reverse("ride-create"),
+            {
+                "driver_id": self.driver.id,
+                "ride_id": "RIDE-E",
+                "pickup_latitude": 12.98,
+                "pickup_longitude": 77.59,
+                "dropoff_latitude": 13.07,
+                "dropoff_longitude": 77.59,
+            },
+        )
+        self.assertEqual(response.data["pickup_latitude"], 12.98)
+
+        eta = self.client_for(self.rider).get(reverse("ride-eta"), {"ids": "RIDE-E"}).data
+        self.assertAlmostEqual(eta["RIDE-E"]["distance_remaining_m"], 1112, delta=1)
+
+        Ride.objects.filter(ride_id="RIDE-E").update(status="in_progress")
+        eta = self.client_for(self.rider).get(reverse("ride-eta"), {"ids": "RIDE-E"}).data
+        self.assertAlmostEqual(eta["RIDE-E"]["distance_remaining_m"], 11119, delta=5)
+
+
+class FixPipelineTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.pipeline = FixPipeline()
+        self.t0 = timezone.now().timestamp() - 600
+
+    def test_rejects_bad_fixes_with_reasons(self):
+        self.assertIsNotNone(self.pipeline.process(Fix(12.97, 77.59, self.t0)))
+
+        cases = [
+            (Fix(91.0, 77.59, self.t0 + 10), "out_of_range"),
+            (Fix(12.98, 77.59, self.t0 - 10), "out_of_order"),
+            (Fix(13.97, 77.59, self.t0 + 10), "impossible_speed"),
+            (Fix(12.970001, 77.59, self.t0 + 10), "jitter"),
+        ]
+        for fix, reason in cases:
+            self.assertIsNone(self.pipeline.process(fix))
+            self.assertEqual(self.pipeline.rejected_reason, reason)
+
+        self.assertIsNotNone(self.pipeline.process(Fix(12.971, 77.59, self.t0 + 10)))
+        counters = metrics.snapshot()
+        self.assertEqual(counters["fix.accepted"], 2)
+        self.assertEqual(counters["fix.rejected.jitter"], 1)
+
+    def test_outlier_first_fix_is_abandoned_after_repeated_rejections(self):
+        # A first fix ~100 km off, then a driver actually moving near 12.97.
+        self.pipeline.process(Fix(13.87, 77.59, self.t0))
+        results = [
+            self.pipeline.process(Fix(12.97 + i / 1000, 77.59, self.t0 + 10 * (i + 1)))
+            for i in range(5)
+        ]
+
+        self.assertEqual([fix is not None for fix in results], [False, False, False, True, True])
+        self.assertEqual(metrics.get("fix.reanchored"), 1)
+
+    def test_kalman_smoother_pulls_noisy_fix_towards_track(self):
+        pipeline = FixPipeline(build_filters() + [KalmanSmoother(default_accuracy_m=20)])
+        pipeline.process(Fix(12.9700, 77.59, self.t0))
+
+        smoothed = pipeline.process(Fix(12.9710, 77.59, self.t0 + 5))
+
+        self.assertTrue(12.9700 < smoothed.latitude < 12.9710)
+
+
+class CadenceTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    async def test_cadence_follows_ride_subscribers(self):
+        await Ride.objects.acreate(
+            ride_id="RIDE-C", driver=self.driver, rider=self.rider, status="in_progress"
+        )
+        driver = await self.connect_socket(self.driver_user)
+        await driver.send_json_to({"event": "driver_identify", "driver_id": self.driver.id})
+        await driver.receive_json_from()
+        self.assertEqual(await driver.receive_json_from(), {"event": "cadence", "interval_ms": 15000})
+
+        rider = await self.connect_socket(self.rider)
+        await rider.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-C"})
+        await rider.receive_json_from()
+        self.assertEqual(await driver.receive_json_from(), {"event": "cadence", "interval_ms": 2000})
+
+        await rider.disconnect()
+        self.assertEqual(await driver.receive_json_from(), {"event": "cadence", "interval_ms": 15000})
+        await driver.disconnect()
+
+
+class RiderBackpressureTests(TestCase):
+    def make_consumer(self, ack_window=2):
+        consumer = TrackingConsumer()
+        consumer.channel_name = "test.rider"
+        consumer.ack_window = ack_window
+        consumer.unacked = deque()
+        consumer.pending_updates = {}
+        consumer.closing = False
+        consumer.sent = []
+        consumer.closed = []
+
+        async def send_json(content, close=False):
+            consumer.sent.append(content)
+
+        async def close(code=None, reason=None):
+            consumer.closed.append(code)
+
+        consumer.send_json = send_json
+        consumer.close = close
+        return consumer
+
+    def update(self, ride_id, seq):
+        return {"type": "location_update", "data": {"ride_id": ride_id, "seq": seq}}
+
+    async def test_riders_without_acks_get_every_frame(self):
+        consumer = self.make_consumer(ack_window=0)
+        for seq in range(1, 6):
+            await consumer.location_update(self.update("R1", seq))
+
+        self.assertEqual([frame["seq"] for frame in consumer.sent], [1, 2, 3, 4, 5])
+
+    async def test_unacked_updates_are_conflated_per_ride(self):
+        metrics.reset()
+        consumer = self.make_consumer(ack_window=2)
+        for seq in range(1, 6):
+            await consumer.location_update(self.update("R1", seq))
+
+        self.assertEqual([frame["seq"] for frame in consumer.sent], [1, 2])
+        self.assertEqual(metrics.get("rider.updates_conflated"), 2)
+
+        await consumer.receive_json({"event": "ack", "ride_id": "R1", "seq": 1})
+        self.assertEqual([frame["seq"] for frame in consumer.sent], [1, 2, 5])
+        self.assertEqual(consumer.pending_updates, {})
+
+        await consumer.receive_json({"event": "ack", "ride_id": "R1", "seq": 5})
+        await consumer.location_update(self.update("R1", 6))
+        self.assertEqual([frame["seq"] for frame in consumer.sent], [1, 2, 5, 6])
+        self.assertEqual(metrics.get("rider.updates_delivered"), 4)
+
+    async def test_stalled_consumer_is_disconnected_once(self):
+        metrics.reset()
+        consumer = self.make_consumer(ack_window=1)
+        await consumer.location_update(self.update("R1", 1))
+        ride_id, seq, sent_at = consumer.unacked[0]
+        consumer.unacked[0] = (ride_id, seq, sent_at - 60)
+
+        with self.settings(TRACKING_SLOW_CONSUMER_SECONDS=10):
+            await consumer.location_update(self.update("R1", 2))
+            await consumer.location_update(self.update("R1", 3))
+
+        self.assertEqual(consumer.closed, [4008])
+        self.assertEqual(consumer.pending_updates, {})
+        self.assertEqual(len(consumer.sent), 1)
+        self.assertEqual(metrics.get("rider.slow_disconnects"), 1)
+
+
+class RideSubscriptionAccessTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.ride = Ride.objects.create(ride_id="RIDE-A", driver=self.driver, rider=self.rider)
+
+    async def test_only_rider_driver_or_staff_can_subscribe(self):
+        stranger = await User.objects.acreate(phone_number="+919999900003")
+        staff = await User.objects.acreate(phone_number="+919999900004", is_staff=True)
+
+        for user, allowed in [
+            (stranger, False),
+            (self.rider, True),
+            (self.driver_user, True),
+            (staff, True),
+        ]:
+            socket = await self.connect_socket(user)
+            await socket.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-A"})
+            expected = (
+                {"status": "subscribed", "ride_id": "RIDE-A"}
+                if allowed
+                else {"error": "Ride not found."}
+            )
+            self.assertEqual(await socket.receive_json_from(), expected)
+            await socket.disconnect()
+
+    def test_access_is_cached_and_evicted_by_new_rides(self):
+        load = async_to_sync(ride_access.permitted_rides)
+        self.assertEqual(load(self.rider.id), {"RIDE-A": self.driver.id})
+        with self.assertNumQueries(0):
+            load(self.rider.id)
+
+        Ride.objects.filter(pk=self.ride.pk).update(status=Ride.Status.COMPLETED)
+        other_driver = Driver.objects.create(user=User.objects.create_user("+919999900005"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Ride.objects.create(ride_id="RIDE-B", driver=other_driver, rider=self.rider)
+        self.assertEqual(load(self.rider.id), {"RIDE-B": other_driver.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.rider).post(
+                reverse("ride-batch-create"),
+                {"rides": [{"driver_id": self.driver.id, "ride_id": "RIDE-C"}]},
+                format="json",
+            )
+        self.assertEqual(load(self.driver_user.id), {"RIDE-C": self.driver.id})
+
+    def test_access_is_evicted_when_a_ride_finishes(self):
+        load = async_to_sync(ride_access.permitted_rides)
+        self.assertEqual(load(self.driver_user.id), {"RIDE-A": self.driver.id})
+        self.assertEqual(load(self.rider.id), {"RIDE-A": self.driver.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.rider).post(
+                reverse("ride-status", args=["RIDE-A"]),
+                {"status": Ride.Status.CANCELLED},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(load(self.driver_user.id), {})
+        self.assertEqual(load(self.rider.id), {})
+
+    async def test_stale_cached_access_is_checked_against_the_db(self):
+        # A load that started before RIDE-A existed, written after its eviction.
+        await cache.aset(ride_access.ACCESS_CACHE_KEY % self.rider.id, {}, 3600)
+
+        socket = await self.connect_socket(self.rider)
+        await socket.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-A"})
+        self.assertEqual(
+            await socket.receive_json_from(), {"status": "subscribed", "ride_id": "RIDE-A"}
+        )
+        await socket.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-X"})
+        self.assertEqual(await socket.receive_json_from(), {"error": "Ride not found."})
+        await socket.disconnect()
+
+        self.assertEqual(
+            await cache.aget(ride_access.ACCESS_CACHE_KEY % self.rider.id),
+            {"RIDE-A": self.driver.id},
+        )
+
+
+class DrainTests(TrackingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        drain.rides.clear()
+        drain.registry.reset()
+        self.addCleanup(drain.registry.reset)
+        Ride.objects.create(ride_id="RIDE-D", driver=self.driver, rider=self.rider)
+
+    async def test_ride_state_keeps_highest_sequence(self):
+        self.assertEqual((await drain.rides.record("R", {"latitude": 1}))["seq"], 1)
+        self.assertEqual((await drain.rides.record("R", {"latitude": 2}))["seq"], 2)
+
+        drain.rides.merge("R", {"latitude": 0, "seq": 1})
+        self.assertEqual(drain.rides.get("R")["latitude"], 2)
+        drain.rides.merge("R", {"latitude": 3, "seq": 5})
+        self.assertEqual(drain.rides.get("R"), {"latitude": 3, "seq": 5})
+
+    async def test_sequence_keeps_rising_for_a_new_writer(self):
+        await drain.rides.record("R", {"latitude": 1})
+        old = await drain.rides.record("R", {"latitude": 2})
+        # A restarted (or different) worker has no local state for the ride.
+        drain.rides.clear()
+
+        fresh = await drain.rides.record("R", {"latitude": 3})
+        self.assertGreater(fresh["seq"], old["seq"])
+        drain.rides.merge("R", old)
+        self.assertEqual(drain.rides.get("R"), fresh)
+
+    async def test_drain_hands_off_state_and_spreads_reconnects(self):
+        layer = get_channel_layer()
+        rider = await self.connect_socket(self.rider)
+
+        # A frame handed over by another worker is served without a query.
+        frame = {"ride_id": "RIDE-D", "latitude": 12.9, "longitude": 77.6, "seq": 7}
+        await layer.send(
+            drain.registry.channel_name,
+            {"type": "ride_state.handoff", "origin": "elsewhere", "rides": {"RIDE-D": frame}},
+        )
+        for _ in range(100):
+            if drain.rides.get("RIDE-D"):
+                break
+            await asyncio.sleep(0.01)
+        await rider.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-D"})
+        await rider.receive_json_from()
+        self.assertEqual(await rider.receive_json_from(), frame)
+
+        peer = await layer.new_channel()
+        await layer.group_add(drain.STATE_GROUP, peer)
+        with self.settings(TRACKING_DRAIN={"reconnect_min_ms": 100, "reconnect_max_ms": 200}):
+            await drain.registry.drain()
+
+        hint = await rider.receive_json_from()
+        self.assertEqual(hint["event"], "reconnect")
+        self.assertTrue(100 <= hint["after_ms"] <= 200)
+        self.assertEqual((await rider.receive_output())["code"], 1012)
+        self.assertEqual((await layer.receive(peer))["rides"]["RIDE-D"], frame)
+
+        late = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f"/ws/tracking/?token={AccessToken.for_user(self.rider)}",
+        )
+        connected, _ = await late.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await late.receive_output(), {"type": "websocket.close", "code": 1013})
+
+
+    async def test_drain_signal_is_handled_from_startup(self):
+        # Installed by TrackingConfig.ready(), not by the first socket.
+        self.assertEqual(signal.getsignal(signal.SIGUSR1), drain.registry._on_signal)
+        rider = await self.connect_socket(self.rider)
+
+        # Python runs the handler on the main thread; this test's loop isn't.
+        os.kill(os.getpid(), signal.SIGUSR1)
+        for _ in range(100):
+            if drain.registry.draining:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertTrue(drain.registry.draining)
+        self.assertEqual((await rider.receive_json_from())["event"], "reconnect")
+
+
+class ReplayTraceTests(TransactionTestCase):
+    # The command runs its own event loop, whose DB calls happen on another
+    # thread; that thread only sees committed rows.
+    def setUp(self):
+        cache.clear()
+        drain.rides.clear()
+        drain.registry.reset()
+
+    def test_replay_trace_reports_what_it_sent(self):
+        rider = User.objects.create_user("+919999900001")
+        driver = Driver.objects.create(user=User.objects.create_user("+919999900002"))
+        Ride.objects.create(
+            ride_id="RIDE-R", driver=driver, rider=rider, status="in_progress"
+        )
+        stranger = User.objects.create_user("+919999900020")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.bin")
+            writer = trace.TraceWriter(path)
+            writer.subscribe(rider.id, "RIDE-R")
+            writer.subscribe(stranger.id, "RIDE-R")
+            now = time.time()
+            for i in range(3):
+                writer.location(driver.id, 12.97 + i / 10000, 77.59, 5.0, now - 30 + i * 10)
+            writer.location(driver.id, 95.0, 77.59, 5.0, now - 5)
+            writer.close()
+
+            out, err = StringIO(), StringIO()
+            call_command("replay_trace", path, speed="max", timeout=5, stdout=out, stderr=err)
+
+        self.assertIn("Replayed 4/4 fixes from 1 drivers and 2 riders", out.getvalue())
+        self.assertIn("3 accepted, 1 rejected", out.getvalue())
+        self.assertIn("1 sockets aborted", out.getvalue())
+        self.assertIn(f"Rider {stranger.id} aborted: Ride not found.", err.getvalue())
+
+
+
+class WorkerMetricsTests(TestCase):
+    def test_worker_snapshots_are_summed(self):
+        metrics.reset()
+        metrics.incr("sockets.open", 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "worker-0.json")
+            metrics.write_snapshot(path, worker=0, pid=123)
+            with open(path) as fh:
+                first = json.load(fh)
+
+        self.assertEqual(first["pid"], 123)
+        second = {"counters": {"sockets.open": 2, "fix.accepted": 5}}
+        self.assertEqual(
+            metrics.merge_snapshots([first, second]),
+            {"sockets.open": 5, "fix.accepted": 5},
+        )
+
+
+class RideChannelLayerTests(TrackingAPITestCase):
+    MEMORY = {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        drain.rides.clear()
+
+    async def test_ride_groups_can_use_their_own_layer(self):
+        await Ride.objects.acreate(
+            ride_id="RIDE-L", driver=self.driver, rider=self.rider, status="in_progress"
+        )
+        with self.settings(
+            CHANNEL_LAYERS={"default": self.MEMORY, "rides": self.MEMORY},
+            TRACKING_RIDE_CHANNEL_LAYER="rides",
+        ):
+            driver = await self.connect_socket(self.driver_user)
+            await driver.send_json_to({"event": "driver_identify", "driver_id": self.driver.id})
+            await driver.receive_json_from()
+            await driver.receive_json_from()
+
+            rider = await self.connect_socket(self.rider)
+            await rider.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-L"})
+            await rider.receive_json_from()
+            await driver.receive_json_from()
+
+            await driver.send_json_to(
+                {"event": "driver_location", "latitude": 12.97, "longitude": 77.59}
+            )
+            self.assertEqual(await driver.receive_json_from(), {"status": "location_updated"})
+            frame = await rider.receive_json_from()
+            self.assertEqual((frame["ride_id"], frame["seq"]), ("RIDE-L", 1))
+
+            self.assertIn("ride_RIDE-L", get_channel_layer("rides").groups)
+            self.assertNotIn("ride_RIDE-L", get_channel_layer().groups)
+            await rider.disconnect()
+            await driver.disconnect()
+
+
+class WebSocketProfileTests(TrackingAPITestCase):
+    async def test_ws_only_application_authenticates_by_jwt(self):
+        from backend.asgi_ws import application
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/tracking/?token={AccessToken.for_user(self.rider)}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+        communicator = WebsocketCommunicator(application, "/ws/tracking/?token=bogus")
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+
+
+class TraceTests(TrackingAPITestCase):
+    async def test_consumer_records_frames_that_read_back(self):
+        await Ride.objects.acreate(ride_id="RIDE-T", driver=self.driver, rider=self.rider)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace-{pid}.bin")
+            with self.settings(TRACKING_TRACE_PATH=path):
+                driver = await self.connect_socket(self.driver_user)
+                await driver.send_json_to({"event": "driver_identify", "driver_id": self.driver.id})
+                await driver.receive_json_from()
+                await driver.receive_json_from()
+                await driver.send_json_to(
+                    {
+                        "event": "driver_location",
+                        "latitude": 12.9715987,
+                        "longitude": 77.594566,
+                        "accuracy": 8,
+                    }
+                )
+                await driver.receive_json_from()
+                rider = await self.connect_socket(self.rider)
+                await rider.send_json_to({"event": "subscribe_ride", "ride_id": "RIDE-T"})
+                await rider.receive_json_from()
+                await rider.disconnect()
+                await driver.disconnect()
+                trace.get_writer().close()
+
+            reader = trace.TraceReader(path.format(pid=os.getpid()))
+            location, subscribe = list(reader)
+            reader.close()
+
+        self.assertEqual(
+            (location.kind, location.actor, location.latitude, location.accuracy, location.client_ts),
+            (trace.LOCATION, self.driver.id, 12.971599, 8.0, None),
+        )
+        self.assertEqual(
+            (subscribe.kind, subscribe.actor, subscribe.ride_id),
+            (trace.SUBSCRIBE, self.rider.id, "RIDE-T"),
+        )
+        self.assertIn("location.total", metrics.timings())
+
+    async def test_unencodable_fixes_are_still_rejected_while_tracing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace-{pid}.bin")
+            with self.settings(TRACKING_TRACE_PATH=path):
+                driver = await self.connect_socket(self.driver_user)
+                await driver.send_json_to({"event": "driver_identify", "driver_id": self.driver.id})
+                await driver.receive_json_from()
+                await driver.receive_json_from()
+                replies = []
+                for frame in (
+                    {"latitude": 1e10, "longitude": 77.5},
+                    {"latitude": float("nan"), "longitude": float("inf")},
+                    {"latitude": 1e400, "longitude": 77.5, "accuracy": 1e40},
+                ):
+                    await driver.send_json_to({"event": "driver_location", **frame})
+                    replies.append(await driver.receive_json_from())
+                await driver.disconnect()
+                trace.get_writer().close()
+
+            reader = trace.TraceReader(path.format(pid=os.getpid()))
+            records = list(reader)
+            reader.close()
+
+        self.assertEqual(
+            replies, [{"status": "location_rejected", "reason": "out_of_range"}] * 3
+        )
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(math.isnan(record.latitude) for record in records))
+        self.assertEqual(records[2].accuracy, math.inf)
+
+    def test_subscribe_records_keep_whole_ride_ids(self):
+        long_id = "R" + "é" * 31 + "🚕" * 32
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.bin")
+            writer = trace.TraceWriter(path)
+            writer.subscribe(self.rider.id, "x" * 64)
+            writer.subscribe(self.rider.id, long_id)
+            writer.subscribe(self.rider.id, 5)
+            writer.close()
+            reader = trace.TraceReader(path)
+            ride_ids = [record.ride_id for record in reader]
+            reader.close()
+
+        self.assertEqual(ride_ids[0], "x" * 64)
+        self.assertEqual(len(long_id), 64)
+        self.assertEqual(ride_ids[1], long_id)
+        self.assertEqual(ride_ids[2], "5")
+
+    def test_timings_summarise_samples(self):
+        metrics.reset()
+        for ms in range(1, 101):
+            metrics.observe("stage", ms / 1000)
+        with metrics.timed("block"):
+            pass
+
+        stats = metrics.timings()
+        self.assertEqual(stats["stage"]["count"], 100)
+        self.assertAlmostEqual(stats["stage"]["p50_ms"], 50.5)
+        self.assertAlmostEqual(stats["stage"]["p99_ms"], 99)
+        self.assertEqual(stats["block"]["count"], 1)
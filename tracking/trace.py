@@ -0,0 +1,175 @@
+"""
+Compact on-disk traces of what driver and rider sockets send.
+
+With ``TRACKING_TRACE_PATH`` set, TrackingConsumer appends one fixed-width
+record per ``driver_location`` and ``subscribe_ride`` frame it receives
+(before any filtering), so the file is exactly the input production saw.
+``{pid}`` in the path is replaced by the worker's pid, which keeps separate
+workers from sharing a file.
+
+``TraceReader`` memory-maps a trace and decodes records on demand, so even
+large traces cost no more memory than the pages being read.
+``manage.py replay_trace`` feeds them back through TrackingConsumer.
+"""
+import atexit
+import math
+import mmap
+import os
+import struct
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+
+MAGIC = b"TRK3"
+HEADER = struct.Struct("<4sH10x")
+# at, kind, actor, lat_e6, lon_e6, accuracy, client_ts, ride_id
+RECORD = struct.Struct("<dB3xIiifd256s4x")
+# Ride.ride_id is at most 64 characters, each at most 4 bytes of UTF-8.
+RIDE_ID_BYTES = 256
+
+LOCATION = 1
+SUBSCRIBE = 2
+
+# Stored for a coordinate that is not finite or doesn't fit the int32 field;
+# read back as NaN.
+MISSING_E6 = -(2**31)
+FLOAT32_MAX = 3.4028234663852886e38
+
+FLUSH_SECONDS = 1.0
+
+
+class TraceRecord(NamedTuple):
+    at: float
+    kind: int
+    # Driver id for LOCATION, user id for SUBSCRIBE.
+    actor: int
+    latitude: float
+    longitude: float
+    accuracy: float | None
+    client_ts: float | None
+    ride_id: str
+
+
+class TraceWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, RECORD.size))
+        self._flushed_at = time.monotonic()
+
+    def location(
+        self, driver_id: int, latitude: float, longitude: float, accuracy=None, client_ts=None
+    ):
+        self._write(LOCATION, driver_id, latitude, longitude, accuracy, client_ts, "")
+
+    def subscribe(self, user_id: int, ride_id):
+        # Clients may send any JSON value; record what they sent as text.
+        if not isinstance(ride_id, str):
+            ride_id = str(ride_id)
+        self._write(SUBSCRIBE, user_id, 0.0, 0.0, None, None, ride_id)
+
+    def _write(self, kind, actor, latitude, longitude, accuracy, client_ts, ride_id):
+        self._file.write(
+            RECORD.pack(
+                time.time(),
+                kind,
+                actor,
+                _e6(latitude),
+                _e6(longitude),
+                _float32(accuracy),
+                math.nan if client_ts is None else client_ts,
+                _truncate(ride_id),
+            )
+        )
+        if time.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def _e6(value: float) -> int:
+    try:
+        scaled = round(value * 1e6)
+    except (ValueError, OverflowError):
+        return MISSING_E6
+    return scaled if MISSING_E6 < scaled < 2**31 else MISSING_E6
+
+
+def _float32(value) -> float:
+    if value is None:
+        return math.nan
+    if abs(value) > FLOAT32_MAX:
+        return math.copysign(math.inf, value)
+    return value
+
+
+def _truncate(ride_id: str) -> bytes:
+    encoded = ride_id.encode()
+    if len(encoded) <= RIDE_ID_BYTES:
+        return encoded
+    # Don't cut a multibyte character in half.
+    return encoded[:RIDE_ID_BYTES].decode(errors="ignore").encode()
+
+
+class TraceReader:
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a tracking trace")
+        # A writer killed mid-flush may leave a partial record; ignore it.
+        self._count = (len(self._mmap) - HEADER.size) // RECORD.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> TraceRecord:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        at, kind, actor, lat_e6, lon_e6, accuracy, client_ts, ride_id = RECORD.unpack_from(
+            self._mmap, HEADER.size + index * RECORD.size
+        )
+        return TraceRecord(
+            at,
+            kind,
+            actor,
+            math.nan if lat_e6 == MISSING_E6 else lat_e6 / 1e6,
+            math.nan if lon_e6 == MISSING_E6 else lon_e6 / 1e6,
+            None if math.isnan(accuracy) else accuracy,
+            None if math.isnan(client_ts) else client_ts,
+            ride_id.rstrip(b"\0").decode(errors="replace"),
+        )
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self):
+        self._mmap.close()
+
+
+_writer: TraceWriter | None = None
+
+
+def get_writer() -> TraceWriter | None:
+    """This process's writer, or ``None`` when tracing is off."""
+    global _writer
+    path = getattr(settings, "TRACKING_TRACE_PATH", None)
+    if not path:
+        return None
+    path = path.format(pid=os.getpid())
+    if _writer is None or _writer.path != path:
+        if _writer is not None:
+            _writer.close()
+        _writer = TraceWriter(path)
+        atexit.register(_writer.close)
+    return _writer
@@ -1,17 +1,31 @@
 from django.urls import path
 
 from .views import (
+    DriverLocationExportView,
+    DriverLocationListView,
     DriverMeView,
+    GeofenceListCreateView,
+    RideBatchCreateView,
     RideCreateView,
     RideDetailView,
+    RideEtaView,
+    RideExportView,
     RideLocationView,
+    RideStatusView,
 )
 
 urlpatterns = [
     path("me/driver/", DriverMeView.as_view(), name="driver-me"),
     path("rides/", RideCreateView.as_view(), name="ride-create"),
+    path("rides/batch/", RideBatchCreateView.as_view(), name="ride-batch-create"),
+    path("rides/eta/", RideEtaView.as_view(), name="ride-eta"),
+    path("rides/export/", RideExportView.as_view(), name="ride-export"),
     path("rides/<str:ride_id>/", RideDetailView.as_view(), name="ride-detail"),
+    path("rides/<str:ride_id>/status/", RideStatusView.as_view(), name="ride-status"),
     path("rides/<str:ride_id>/location/", RideLocationView.as_view(), name="ride-location"),
+    path("locations/", DriverLocationListView.as_view(), name="location-list"),
+    path("locations/export/", DriverLocationExportView.as_view(), name="location-export"),
+    path("geofences/", GeofenceListCreateView.as_view(), name="geofence-list"),
 ]
 
 
@@ -1,15 +1,30 @@
 import uuid
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Driver, DriverLocation, Ride
+from . import ride_access
+from .events import broadcast_ride_status
+from .export import EXPORT_FORMATS, stream_queryset
+from .models import Driver, DriverLocation, Geofence, Ride
+from .pagination import IdCursorPagination
+from .progress import estimate_rides
 from .serializers import (
     DriverSerializer,
+    RideBatchItemSerializer,
+    RideIdsSerializer,
+    RidePointsSerializer,
     RideSerializer,
     DriverLocationSerializer,
+    GeofenceSerializer,
 )
 
 
@@ -40,14 +55,131 @@ class DriverMeView(APIView):
         )
 
 
+def _batch_limit() -> int:
+    return int(getattr(settings, "TRACKING_RIDE_BATCH_LIMIT", 500))
+
+
+def _filter_by_time(queryset, request, field: str):
+    """
+    Apply ?since= / ?until= (ISO 8601) to ``field``.
+    """
+    for param, lookup in (("since", "gte"), ("until", "lt")):
+        raw = request.query_params.get(param)
+        if not raw:
+            continue
+        try:
+            value = parse_datetime(raw)
+        except ValueError:
+            # Well formed but impossible, e.g. 2024-02-30.
+            value = None
+        if value is None:
+            raise ValidationError({param: "Expected an ISO 8601 datetime."})
+        queryset = queryset.filter(**{f"{field}__{lookup}": value})
+    return queryset
+
+
+def _int_param(request, name: str):
+    raw = request.query_params.get(name)
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValidationError({name: "Expected an integer id."})
+
+
+def _visible_rides(user):
+    """
+    Staff see every ride; everyone else sees rides they ride in or drive.
+    """
+    queryset = Ride.objects.all()
+    if not user.is_staff:
+        queryset = queryset.filter(Q(rider=user) | Q(driver__user=user))
+    return queryset
+
+
+def _filter_rides(request):
+    """
+    Rides visible to the user, narrowed by ?driver=, ?rider=, ?since=, ?until=.
+    """
+    queryset = _visible_rides(request.user)
+
+    driver_id = _int_param(request, "driver")
+    if driver_id is not None:
+        queryset = queryset.filter(driver_id=driver_id)
+    rider_id = _int_param(request, "rider")
+    if rider_id is not None:
+        queryset = queryset.filter(rider_id=rider_id)
+    return _filter_by_time(queryset, request, "created_at")
+
+
+def _filter_locations(request):
+    """
+    Driver locations narrowed by ?driver=, ?since=, ?until= (on updated_at).
+    """
+    queryset = DriverLocation.objects.all()
+    driver_id = _int_param(request, "driver")
+    if driver_id is not None:
+        queryset = queryset.filter(driver_id=driver_id)
+    return _filter_by_time(queryset, request, "updated_at")
+
+
+def _validated_ride_ids(ids: list[str]) -> list[str]:
+    serializer = RideIdsSerializer(data={"ids": ids})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data["ids"]
+
+
+def _export_format(request) -> str:
+    output = request.query_params.get("output", "ndjson")
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({"output": f"Choose one of: {', '.join(EXPORT_FORMATS)}."})
+    return output
+
+
 class RideCreateView(APIView):
     """
-    Create a ride linking a driver and the current user (rider).
+    Create a ride linking a driver and the current user (rider), list rides,
+    or look up many rides at once.
 
     - POST /tracking/rides/
       body: {"driver_id": 1, "ride_id": "optional-custom-id"}
+    - GET  /tracking/rides/?driver=&rider=&since=&until=&cursor=
+      (keyset-paginated, newest first)
+    - GET  /tracking/rides/?ids=RIDE1,RIDE2,...
     """
 
+    def get(self, request):
+        if "ids" not in request.query_params:
+            paginator = IdCursorPagination()
+            page = paginator.paginate_queryset(_filter_rides(request), request, view=self)
+            return paginator.get_paginated_response(RideSerializer(page, many=True).data)
+
+        ids = [ride_id for ride_id in request.query_params["ids"].split(",") if ride_id]
+        if not ids:
+            return Response(
+                {"detail": "ids is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ids) > _batch_limit():
+            return Response(
+                {"detail": f"At most {_batch_limit()} ids per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = _validated_ride_ids(ids)
+
+        # One query; the serializer only needs the FK ids, so no joins.
+        # Rides the user can't see are reported as missing, like unknown ones.
+        rides = list(_visible_rides(request.user).filter(ride_id__in=ids))
+        found = {ride.ride_id for ride in rides}
+        return Response(
+            {
+                "results": RideSerializer(rides, many=True).data,
+                "missing": [ride_id for ride_id in dict.fromkeys(ids) if ride_id not in found],
+            },
+            status=status.HTTP_200_OK,
+        )
+
     def post(self, request):
         driver_id = request.data.get("driver_id")
         if not driver_id:
@@ -56,17 +188,31 @@ class RideCreateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        points = RidePointsSerializer(data=request.data)
+        points.is_valid(raise_exception=True)
+
         driver = get_object_or_404(Driver, id=driver_id)
 
         ride_id = request.data.get("ride_id") or f"RIDE-{uuid.uuid4().hex[:10]}"
 
-        ride, created = Ride.objects.get_or_create(
-            ride_id=ride_id,
-            defaults={
-                "driver": driver,
-                "rider": request.user,
-            },
-        )
+        try:
+            ride, created = Ride.objects.get_or_create(
+                ride_id=ride_id,
+                defaults={
+                    "driver": driver,
+                    "rider": request.user,
+                    **points.validated_data,
+                },
+            )
+        except IntegrityError:
+            # get_or_create() already retried a clashing ride_id, so this is
+            # normally the one-active-ride-per-driver index; check, don't assume.
+            if not Ride.objects.active().filter(driver=driver).exists():
+                raise
+            return Response(
+                {"detail": "Driver already has an active ride."},
+                status=status.HTTP_409_CONFLICT,
+            )
         data = RideSerializer(ride).data
         return Response(
             data,
@@ -74,6 +220,171 @@ class RideCreateView(APIView):
         )
 
 
+class RideBatchCreateView(APIView):
+    """
+    Create many rides for the current user (rider) in one transaction.
+
+    - POST /tracking/rides/batch/
+      body: {"rides": [{"driver_id": 1, "ride_id": "optional-custom-id"}, ...]}
+
+    Rides whose ride_id already exists are returned under "existing". Rides
+    that would give a driver a second active ride are skipped and listed
+    under "rejected".
+    """
+
+    def post(self, request):
+        items = request.data.get("rides") if hasattr(request.data, "get") else None
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "rides must be a non-empty list."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > _batch_limit():
+            return Response(
+                {"detail": f"At most {_batch_limit()} rides per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        batch = RideBatchItemSerializer(data=items, many=True)
+        batch.is_valid(raise_exception=True)
+        rides = []
+        for data in batch.validated_data:
+            ride_id = data.pop("ride_id", "") or f"RIDE-{uuid.uuid4().hex[:10]}"
+            rides.append(
+                Ride(
+                    ride_id=ride_id,
+                    driver_id=data.pop("driver_id"),
+                    rider=request.user,
+                    **data,
+                )
+            )
+
+        ride_ids = [ride.ride_id for ride in rides]
+        if len(set(ride_ids)) != len(ride_ids):
+            return Response(
+                {"detail": "Duplicate ride_id in batch."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        driver_ids = {ride.driver_id for ride in rides}
+        driver_users = dict(
+            Driver.objects.filter(id__in=driver_ids).values_list("id", "user_id")
+        )
+        if driver_users.keys() != driver_ids:
+            return Response(
+                {"detail": "Driver not found.", "driver_ids": sorted(driver_ids - driver_users.keys())},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        with transaction.atomic():
+            existing = set(
+                Ride.objects.filter(ride_id__in=ride_ids).values_list("ride_id", flat=True)
+            )
+            Ride.objects.bulk_create(
+                [ride for ride in rides if ride.ride_id not in existing],
+                ignore_conflicts=True,
+            )
+            stored = {ride.ride_id: ride for ride in Ride.objects.filter(ride_id__in=ride_ids)}
+            # bulk_create() sends no post_save, so evict subscribe access here.
+            ride_access.forget_users([request.user.id, *driver_users.values()])
+
+        created = [
+            stored[ride_id]
+            for ride_id in ride_ids
+            if ride_id in stored and ride_id not in existing
+        ]
+        already_there = [stored[ride_id] for ride_id in ride_ids if ride_id in existing]
+        return Response(
+            {
+                "created": RideSerializer(created, many=True).data,
+                "existing": RideSerializer(already_there, many=True).data,
+                "rejected": [
+                    {"ride_id": ride_id, "detail": "Driver already has an active ride."}
+                    for ride_id in ride_ids
+                    if ride_id not in stored
+                ],
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class RideEtaView(APIView):
+    """
+    Straight-line distance remaining and ETA for many rides at once.
+
+    - GET /tracking/rides/eta/?ids=RIDE1,RIDE2,...
+
+    Uses each driver's last stored location and the ride's current target
+    (pickup, or drop-off once in progress). One query for the whole batch.
+    """
+
+    def get(self, request):
+        ids = [ride_id for ride_id in request.query_params.get("ids", "").split(",") if ride_id]
+        if not ids or len(ids) > _batch_limit():
+            return Response(
+                {"detail": f"ids must list between 1 and {_batch_limit()} rides."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = _validated_ride_ids(ids)
+
+        rides = _visible_rides(request.user).filter(ride_id__in=ids)
+        estimates = estimate_rides(rides.select_related("driver__location"))
+        if not estimates:
+            return Response({"detail": "Ride not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(estimates, status=status.HTTP_200_OK)
+
+
+class RideExportView(APIView):
+    """
+    Stream every matching ride (staff only).
+
+    - GET /tracking/rides/export/?output=ndjson|csv&driver=&rider=&since=&until=
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return stream_queryset(
+            _filter_rides(request).order_by("id"),
+            ("ride_id", "driver_id", "rider_id", "status", "created_at"),
+            _export_format(request),
+            "rides",
+        )
+
+
+class DriverLocationListView(APIView):
+    """
+    List driver locations (staff only), keyset-paginated.
+
+    - GET /tracking/locations/?driver=&since=&until=&cursor=
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(_filter_locations(request), request, view=self)
+        return paginator.get_paginated_response(DriverLocationSerializer(page, many=True).data)
+
+
+class DriverLocationExportView(APIView):
+    """
+    Stream every matching driver location (staff only).
+
+    - GET /tracking/locations/export/?output=ndjson|csv&driver=&since=&until=
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return stream_queryset(
+            _filter_locations(request).order_by("id"),
+            ("driver_id", "latitude", "longitude", "updated_at"),
+            _export_format(request),
+            "driver_locations",
+        )
+
+
 class RideDetailView(APIView):
     """
     Get basic details of a ride.
@@ -87,6 +398,56 @@ class RideDetailView(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
+class RideStatusView(APIView):
+    """
+    Move a ride through its lifecycle.
+
+    - POST /tracking/rides/<ride_id>/status/
+      body: {"status": "accepted" | "in_progress" | "completed" | "cancelled"}
+
+    The ride's driver may make any allowed transition; the rider may only
+    cancel.
+    """
+
+    def post(self, request, ride_id: str):
+        ride = get_object_or_404(Ride.objects.select_related("driver"), ride_id=ride_id)
+        new_status = request.data.get("status")
+
+        if new_status not in Ride.Status.values:
+            return Response(
+                {"detail": "Invalid status."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        is_driver = ride.driver.user_id == request.user.id
+        is_rider = ride.rider_id == request.user.id
+        if not (
+            request.user.is_staff
+            or is_driver
+            or (is_rider and new_status == Ride.Status.CANCELLED)
+        ):
+            return Response(
+                {"detail": "You cannot change this ride's status."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # Conditional update so two racing transitions can't both win.
+        if not ride.can_transition_to(new_status) or not Ride.objects.filter(
+            pk=ride.pk, status=ride.status
+        ).update(status=new_status):
+            return Response(
+                {"detail": f"Cannot move ride from {ride.status} to {new_status}."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        ride.status = new_status
+        # .update() sends no post_save; a finished ride must stop being followable.
+        ride_access.forget_users([ride.rider_id, ride.driver.user_id])
+        broadcast_ride_status(ride)
+        data = RideSerializer(ride).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class RideLocationView(APIView):
     """
     Get latest driver location for a ride.
@@ -95,7 +456,9 @@ class RideLocationView(APIView):
     """
 
     def get(self, request, ride_id: str):
-        ride = get_object_or_404(Ride, ride_id=ride_id)
+        ride = get_object_or_404(
+            Ride.objects.select_related("driver__location"), ride_id=ride_id
+        )
         location = getattr(ride.driver, "location", None)
         if not location:
             return Response(
@@ -106,3 +469,28 @@ class RideLocationView(APIView):
         data = DriverLocationSerializer(location).data
         return Response(data, status=status.HTTP_200_OK)
 
+
+class GeofenceListCreateView(APIView):
+    """
+    Register and list geofences (staff only).
+
+    - GET  /tracking/geofences/
+    - POST /tracking/geofences/
+      body: {"name": "Airport queue", "kind": "circle",
+             "center_latitude": 13.19, "center_longitude": 77.70, "radius_m": 500}
+         or {"name": "Pickup zone", "kind": "polygon",
+             "vertices": [[12.97, 77.59], [12.98, 77.59], [12.98, 77.60]]}
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(Geofence.objects.all(), request, view=self)
+        return paginator.get_paginated_response(GeofenceSerializer(page, many=True).data)
+
+    def post(self, request):
+        serializer = GeofenceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)